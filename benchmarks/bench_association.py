@@ -0,0 +1,112 @@
+"""
+关联表双向查找的基准测试: 在 SQLite 中写入数百万行 `UserCourse`, 分别测量
+`user.ref_courses`(走联合主键) 与 `course.ref_users`(走 course_id 上的索引) 的查找延迟,
+再删除 course_id 上的索引测量一次 `course.ref_users` 作为对照。需要安装 SQLAlchemy。
+
+    python -m benchmarks.bench_association
+
+选项:
+    --users=<n>         User 的数量, 默认 20000
+    --courses=<n>       Course 的数量, 默认 2000
+    --per-user=<n>      每个 User 关联的 Course 数, 默认 100, 即默认 200 万行关联
+    --lookups=<n>       每个方向随机查找的次数, 取中位数, 默认 50
+"""
+import importlib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from random import Random
+from dbglang.dbg_compiler import compile, split_flags
+
+SCHEMA = """
+User(id: int~){
+    name: NameStr!
+}
+
+Course(id: int~){
+    title: NameStr!
+}
+
+User <<->> Course{
+    score: int?
+}
+"""
+
+CHUNK = 100000
+
+
+def load(module, users: int, courses: int, per_user: int, rand: Random) -> None:
+    engine = module.engine
+    module.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(module.User.__table__.insert(), [{'id': i, 'name': f'u{i}'} for i in range(1, users + 1)])
+        conn.execute(module.Course.__table__.insert(), [{'id': i, 'title': f'c{i}'} for i in range(1, courses + 1)])
+        rows = []
+        for user_id in range(1, users + 1):
+            for course_id in rand.sample(range(1, courses + 1), per_user):
+                rows.append({'user_id': user_id, 'course_id': course_id})
+            if len(rows) >= CHUNK:
+                conn.execute(module.UserCourse.__table__.insert(), rows)
+                rows = []
+        if rows:
+            conn.execute(module.UserCourse.__table__.insert(), rows)
+
+
+def lookup_ms(entity_type, relation: str, ids, module) -> float:
+    session = module.db_session
+    timings = []
+    for each in ids:
+        entity = session.query(entity_type).get(each)
+        start = time.perf_counter()
+        getattr(entity, relation).all()
+        timings.append((time.perf_counter() - start) * 1000)
+        session.expunge_all()
+    return statistics.median(timings)
+
+
+def main(*args) -> int:
+    flags, _ = split_flags(args)
+    users = int(flags.get('users', 20000))
+    courses = int(flags.get('courses', 2000))
+    per_user = min(int(flags.get('per_user', 100)), courses)
+    lookups = int(flags.get('lookups', 50))
+    rand = Random(0)
+
+    workdir = tempfile.mkdtemp()
+    sys.path.insert(0, workdir)
+    try:
+        input_file = os.path.join(workdir, 'schema.dbg')
+        with open(input_file, 'w') as f:
+            f.write(SCHEMA)
+        database = os.path.join(workdir, 'bench.db')
+        compile(input_file, os.path.join(workdir, 'bench_models.py'), '--no-cache', '--samples=1',
+                f"database_url = 'sqlite:///{database}'; database_connect_options = {{}}")
+        module = importlib.import_module('bench_models')
+
+        start = time.perf_counter()
+        load(module, users, courses, per_user, rand)
+        print(f'loaded {users * per_user} association rows in {time.perf_counter() - start:.1f}s')
+
+        user_ids = [rand.randint(1, users) for _ in range(lookups)]
+        course_ids = [rand.randint(1, courses) for _ in range(lookups)]
+        print(f'user.ref_courses    {lookup_ms(module.User, "ref_courses", user_ids, module):>10.2f}ms')
+        print(f'course.ref_users    {lookup_ms(module.Course, "ref_users", course_ids, module):>10.2f}ms')
+
+        with module.engine.begin() as conn:
+            for index in module.UserCourse.__table__.indexes:
+                index.drop(conn)
+        print(f'course.ref_users    {lookup_ms(module.Course, "ref_users", course_ids, module):>10.2f}ms'
+              f'  (without the course_id index)')
+        module.db_session.remove()
+        module.engine.dispose()
+    finally:
+        sys.path.remove(workdir)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,127 @@
+"""
+完整编译流程(`dbg_compiler.compile`)的基准测试。
+
+    python -m benchmarks.bench_compile                 # 运行并打印结果
+    python -m benchmarks.bench_compile --save          # 运行并写入 baseline.json
+    python -m benchmarks.bench_compile --check         # 与 baseline.json 比较, 变慢超过容忍度时返回 1
+
+选项:
+    --sizes=10,100,1000,10000   表的数量
+    --samples=<n>               每个表生成的测试样例数, 默认与 baseline 一致
+    --tolerance=<x>             允许的相对变慢比例, 默认 0.5; 绝对差值小于 50ms 的不算变慢
+
+不同机器的速度差异用一段固定的纯 Python 计算(calibrate)换算。
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dbglang.dbg_compiler import compile, split_flags
+from dbglang.profiling import Profiler
+from .synthetic import make_schema
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+DEFAULT_SAMPLES = 20
+MIN_REGRESSION = 0.05
+
+
+def calibrate(repeat: int = 5) -> float:
+    def work():
+        d = {}
+        for i in range(200000):
+            d[str(i)] = f'{i}-{i % 7}'
+        return ','.join(d.values())
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(n_tables: int, samples: int, workdir: str) -> dict:
+    input_file = os.path.join(workdir, f'schema_{n_tables}.dbg')
+    out_file = os.path.join(workdir, f'out_{n_tables}.py')
+    with open(input_file, 'w') as f:
+        f.write(make_schema(n_tables))
+
+    repeat = 5 if n_tables <= 1000 else 1
+    best = None
+    for _ in range(repeat):
+        profiler = Profiler(trace_memory=False)
+        start = time.perf_counter()
+        compile(input_file, out_file, '--no-cache', '--jobs=1', f'--samples={samples}', profiler=profiler)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best['seconds']:
+            best = {'seconds': seconds, 'phases': dict(profiler.seconds)}
+    return best
+
+
+def run(sizes, samples: int) -> dict:
+    workdir = tempfile.mkdtemp()
+    try:
+        results = {}
+        for n in sizes:
+            results[str(n)] = bench(n, samples, workdir)
+            print(f'{n:>8} tables {results[str(n)]["seconds"]:>10.3f}s', file=sys.stderr)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(*args) -> int:
+    flags, _ = split_flags(args)
+    baseline = None
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+
+    sizes = [int(each) for each in flags['sizes'].split(',')] if 'sizes' in flags else DEFAULT_SIZES
+    samples = int(flags.get('samples', baseline['samples'] if baseline else DEFAULT_SAMPLES))
+    calibration = calibrate()
+    results = run(sizes, samples)
+    calibration = min(calibration, calibrate())
+
+    if flags.get('save'):
+        with open(BASELINE, 'w') as f:
+            json.dump({'samples': samples,
+                       'calibration': calibration,
+                       'python': sys.version.split()[0],
+                       'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        return 0
+
+    if not flags.get('check'):
+        return 0
+
+    if baseline is None:
+        print(f'no baseline at {BASELINE}, run with --save first', file=sys.stderr)
+        return 1
+    if samples != baseline['samples']:
+        print(f'--samples={samples} differs from the baseline ({baseline["samples"]})', file=sys.stderr)
+        return 1
+
+    tolerance = float(flags.get('tolerance', 0.5))
+    scale = calibration / baseline['calibration']
+    failed = False
+    for n, result in results.items():
+        if n not in baseline['results']:
+            continue
+        expected = baseline['results'][n]['seconds'] * scale
+        ratio = result['seconds'] / expected
+        status = 'ok' if ratio <= 1 + tolerance or result['seconds'] - expected < MIN_REGRESSION else 'REGRESSION'
+        failed = failed or status != 'ok'
+        print(f'{n:>8} tables {result["seconds"]:>10.3f}s  expected {expected:>10.3f}s  x{ratio:.2f}  {status}')
+        if status != 'ok':
+            for phase, seconds in result['phases'].items():
+                base = baseline['results'][n]['phases'].get(phase, 0) * scale
+                print(f'{"":>10}{phase:<20}{seconds:>10.3f}s  expected {base:>10.3f}s')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,120 @@
+"""
+级联删除的基准测试: 删除一个拥有大量 Course(每个 Course 又拥有若干 Note) 的 User,
+比较逐个加载实例删除的 `delete_user`、按集合删除的 `bulk_delete_user` 与分批提交的 `delete_user_chunked`
+的耗时和执行的语句数。需要安装 SQLAlchemy。
+
+    python -m benchmarks.bench_delete
+
+选项:
+    --courses=<n>       User 拥有的 Course 数, 默认 10000
+    --notes=<n>         每个 Course 拥有的 Note 数, 默认 2
+    --chunk-size=<n>    delete_user_chunked 每批的 id 数, 默认 500
+    --skip-orm          不运行 delete_user
+    --db-cascade        以 `--db-cascade` 编译, 级联删除由数据库完成
+"""
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from sqlalchemy import event
+from dbglang.dbg_compiler import compile, split_flags
+
+SCHEMA = """
+User(id: int~){
+    name: NameStr!
+}
+
+Course(id: int~){
+    title: NameStr!
+}
+
+Note(id: int~){
+    text: TextStr?
+}
+
+User^ <<->> Course{
+    score: int?
+}
+
+Course^ <->> Note{
+
+}
+"""
+
+
+def load(module, user_id: int, courses: int, notes: int) -> None:
+    first_course = (user_id - 1) * courses + 1
+    course_ids = range(first_course, first_course + courses)
+    note_ids = range((first_course - 1) * notes + 1, (first_course + courses - 1) * notes + 1)
+    with module.engine.begin() as conn:
+        conn.execute(module.User.__table__.insert(), [{'id': user_id, 'name': f'u{user_id}'}])
+        conn.execute(module.Course.__table__.insert(), [{'id': i, 'title': f'c{i}'} for i in course_ids])
+        conn.execute(module.Note.__table__.insert(), [{'id': i} for i in note_ids])
+        conn.execute(module.UserCourse.__table__.insert(), [{'user_id': user_id, 'course_id': i} for i in course_ids])
+        conn.execute(module.CourseNote.__table__.insert(),
+                     [{'course_id': first_course + (i - note_ids[0]) // notes, 'note_id': i} for i in note_ids])
+
+
+def measure(module, delete) -> tuple:
+    statements = [0]
+
+    def count(*_):
+        statements[0] += 1
+
+    event.listen(module.engine, 'before_cursor_execute', count)
+    start = time.perf_counter()
+    try:
+        delete()
+        module.db_session.commit()
+    finally:
+        event.remove(module.engine, 'before_cursor_execute', count)
+    return time.perf_counter() - start, statements[0]
+
+
+def main(*args) -> int:
+    flags, _ = split_flags(args)
+    courses = int(flags.get('courses', 10000))
+    notes = int(flags.get('notes', 2))
+    chunk_size = int(flags.get('chunk_size', 500))
+
+    workdir = tempfile.mkdtemp()
+    sys.path.insert(0, workdir)
+    try:
+        input_file = os.path.join(workdir, 'schema.dbg')
+        with open(input_file, 'w') as f:
+            f.write(SCHEMA)
+        database = os.path.join(workdir, 'bench.db')
+        options = ['--db-cascade'] if flags.get('db_cascade') else []
+        compile(input_file, os.path.join(workdir, 'bench_delete_models.py'), '--no-cache', '--samples=1', *options,
+                f"database_url = 'sqlite:///{database}'; database_connect_options = {{}}")
+        module = importlib.import_module('bench_delete_models')
+        module.Base.metadata.create_all(module.engine)
+        print(f'1 user, {courses} courses, {courses * notes} notes')
+
+        load(module, 1, courses, notes)
+        seconds, statements = measure(module, lambda: module.bulk_delete_user([1]))
+        print(f'bulk_delete_user   {seconds:>10.3f}s  {statements:>8} statements')
+
+        load(module, 2, courses, notes)
+        user = module.User.query.get(2)
+        seconds, statements = measure(module, lambda: module.delete_user_chunked(user, chunk_size, commit=True))
+        print(f'delete_user_chunked{seconds:>10.3f}s  {statements:>8} statements')
+
+        if not flags.get('skip_orm'):
+            load(module, 3, courses, notes)
+            user = module.User.query.get(3)
+            seconds, statements = measure(module, lambda: module.delete_user(user))
+            print(f'delete_user        {seconds:>10.3f}s  {statements:>8} statements')
+
+        module.db_session.remove()
+        module.engine.dispose()
+    finally:
+        sys.path.remove(workdir)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,107 @@
+"""
+批量导入的基准测试: 在 SQLite 中分别以 ORM(`db_session.add_all`)、`bulk_insert_<table>`
+以及 `bulk_load` 中的 `bulk_insert_<table>` 写入 User 与关联表 UserCourse, 比较每秒写入的行数。需要安装 SQLAlchemy。
+
+    python -m benchmarks.bench_insert
+
+选项:
+    --users=<n>         每种方式写入的 User 数, 默认 100000
+    --per-user=<n>      每个 User 关联的 Course 数, 默认 10
+    --orm-users=<n>     ORM 方式写入的 User 数, 默认 10000
+    --batch-size=<n>    bulk_insert 每批的行数, 默认 1000
+"""
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dbglang.dbg_compiler import compile, split_flags
+
+SCHEMA = """
+User(id: int~){
+    name : NameStr
+    email: NameStr?@
+    cost : int = 0
+
+    index{name, cost}
+}
+
+Course(id: int~){
+    title: NameStr!
+}
+
+User <<->> Course{
+    score: int?
+}
+"""
+
+COURSES = 1000
+
+
+def users(first: int, n: int):
+    return ({'id': i, 'name': f'u{i}', 'email': f'u{i}@example.com', 'cost': i % 100} for i in range(first, first + n))
+
+
+def links(first: int, n: int, per_user: int):
+    return ({'user_id': i, 'course_id': (i * 7 + j) % COURSES + 1, 'score': j}
+            for i in range(first, first + n) for j in range(per_user))
+
+
+def rate(rows: int, seconds: float) -> str:
+    return f'{rows:>9} rows  {seconds:>8.2f}s  {rows / seconds:>10.0f} rows/s'
+
+
+def main(*args) -> int:
+    flags, _ = split_flags(args)
+    n = int(flags.get('users', 100000))
+    per_user = int(flags.get('per_user', 10))
+    orm_users = int(flags.get('orm_users', 10000))
+    batch_size = int(flags.get('batch_size', 1000))
+
+    workdir = tempfile.mkdtemp()
+    sys.path.insert(0, workdir)
+    try:
+        input_file = os.path.join(workdir, 'schema.dbg')
+        with open(input_file, 'w') as f:
+            f.write(SCHEMA)
+        database = os.path.join(workdir, 'bench.db')
+        compile(input_file, os.path.join(workdir, 'bench_insert_models.py'), '--no-cache', '--samples=1',
+                f"database_url = 'sqlite:///{database}'; database_connect_options = {{}}")
+        module = importlib.import_module('bench_insert_models')
+        session = module.db_session
+        module.bulk_insert_course({'id': i, 'title': f'c{i}'} for i in range(1, COURSES + 1))
+        session.commit()
+
+        start = time.perf_counter()
+        session.add_all(module.User(**row) for row in users(1, orm_users))
+        session.add_all(module.UserCourse(**row) for row in links(1, orm_users, per_user))
+        session.commit()
+        session.expunge_all()
+        print(f'orm add_all          {rate(orm_users * (per_user + 1), time.perf_counter() - start)}')
+
+        first = orm_users + 1
+        start = time.perf_counter()
+        module.bulk_insert_user(users(first, n), batch_size)
+        module.bulk_insert_user_course(links(first, n, per_user), batch_size)
+        session.commit()
+        print(f'bulk_insert          {rate(n * (per_user + 1), time.perf_counter() - start)}')
+
+        first += n
+        start = time.perf_counter()
+        with module.bulk_load(module.User, module.UserCourse):
+            module.bulk_insert_user(users(first, n), batch_size)
+            module.bulk_insert_user_course(links(first, n, per_user), batch_size)
+        print(f'bulk_load + insert   {rate(n * (per_user + 1), time.perf_counter() - start)}'
+              f'  (including index rebuild)')
+
+        session.remove()
+        module.engine.dispose()
+    finally:
+        sys.path.remove(workdir)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,46 @@
+"""
+分词加解析的耗时随 schema 规模的变化。
+
+    python -m benchmarks.bench_parse [--legacy] [sizes...]
+"""
+import sys
+import time
+from dbglang.etoken import token
+from dbglang.scanner import scan
+from dbglang.rdp import parse
+from .synthetic import make_schema
+
+
+def legacy_parser():
+    from Ruikowa.ErrorFamily import handle_error
+    from Ruikowa.ObjectRegex.MetaInfo import MetaInfo
+    from dbglang.dbp import Stmts
+    parser = handle_error(Stmts)
+    return lambda source: parser(token(source), meta=MetaInfo(), partial=False)
+
+
+def bench(parser, n_tables: int, repeat: int = 3) -> float:
+    source = make_schema(n_tables)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser(source)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(*args):
+    parsers = [('rdp', lambda source: parse(scan(source)))]
+    if '--legacy' in args:
+        parsers.append(('legacy', legacy_parser()))
+    sizes = [int(each) for each in args if not each.startswith('--')] or [100, 200, 400, 800, 1600]
+
+    print(f'{"parser":<8}{"tables":>8}{"seconds":>12}{"us/table":>12}')
+    for name, parser in parsers:
+        for n in sizes:
+            seconds = bench(parser, n)
+            print(f'{name:<8}{n:>8}{seconds:>12.4f}{seconds / n * 1e6:>12.1f}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
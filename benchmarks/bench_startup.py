@@ -0,0 +1,88 @@
+"""
+dbgc 启动耗时的基准测试: 命中缓存时整个进程的耗时, 以及此时导入了哪些模块。
+
+    python -m benchmarks.bench_startup                 # 打印结果
+    python -m benchmarks.bench_startup --check         # 超过上限或导入了不该导入的模块时返回 1
+
+选项:
+    --repeat=<n>        运行次数, 取最小值, 默认 10
+    --max-ms=<ms>       命中缓存的构建相对于空解释器(python -c pass)允许多用的毫秒数, 默认 50
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dbglang.dbg_compiler import split_flags
+from .synthetic import make_schema
+
+# 命中缓存时不应导入的模块
+HEAVY_MODULES = ('Ruikowa', 'dbglang.dbp', 'dbglang.code_gen', 'dbglang.table_info_gen',
+                 'dbglang.auto_db_test_maker', 'dbglang.link', 'dbglang.parse', 'dbglang.delete_plan',
+                 'concurrent.futures')
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_of(cmd, repeat: int, env: dict, cwd: str) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def imported_modules(cmd, env: dict, cwd: str) -> set:
+    result = subprocess.run([cmd[0], '-X', 'importtime', *cmd[1:]], env=env, cwd=cwd, check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            modules.add(line.rsplit('|', 1)[1].strip())
+    return modules
+
+
+def main(*args) -> int:
+    flags, _ = split_flags(args)
+    repeat = int(flags.get('repeat', 10))
+    max_ms = float(flags.get('max_ms', 50))
+
+    workdir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(workdir, 'schema.dbg'), 'w') as f:
+            f.write(make_schema(100))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (PACKAGE_ROOT, os.environ.get('PYTHONPATH')))))
+        env.pop('DBGC_CACHE_DIR', None)
+        cmd = [sys.executable, '-m', 'dbglang', 'schema.dbg', 'out.py', '--samples=20']
+
+        # 第一次运行填充缓存
+        subprocess.run(cmd, env=env, cwd=workdir, check=True)
+        interpreter = best_of([sys.executable, '-c', 'pass'], repeat, env, workdir)
+        cached = best_of(cmd, repeat, env, workdir)
+        heavy = sorted(name for name in imported_modules(cmd, env, workdir)
+                       if any(name == each or name.startswith(each + '.') for each in HEAVY_MODULES))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    overhead_ms = (cached - interpreter) * 1000
+    print(f'python -c pass      {interpreter * 1000:>8.1f}ms')
+    print(f'dbgc (cached)       {cached * 1000:>8.1f}ms  (+{overhead_ms:.1f}ms)')
+    if heavy:
+        print(f'imported on the cached path: {", ".join(heavy)}')
+
+    if not flags.get('check'):
+        return 0
+    failed = False
+    if overhead_ms > max_ms:
+        print(f'cached build overhead {overhead_ms:.1f}ms exceeds {max_ms:.0f}ms', file=sys.stderr)
+        failed = True
+    if heavy:
+        print('the cached path must not import parser or code generation modules', file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""
+生成指定规模的 .dbg 源码, 用于基准测试。
+
+    make_schema(n_tables, relations_per_kind, owned)
+
+n_tables 个表; `<->`, `<<->`, `<<->>` 三种关系各 relations_per_kind 个;
+其中 owned 比例的关系在一侧带所有权标记 `^`。所有权总是从下标小的表指向下标大的表, 不会成环。
+"""
+from random import Random
+from typing import Optional
+
+RELATION_KINDS = ('<->', '<<->', '<<->>')
+
+
+def table_name(i: int) -> str:
+    # Symbol 只允许字母和下划线
+    name = ''
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        name = chr(ord('a') + r) + name
+    return 'T' + name
+
+
+def make_table(name: str) -> str:
+    return (f'{name}(id: int~){{\n'
+            f'    name    : NameStr!\n'
+            f'    info    : TextStr?\n'
+            f'    cost    : int = 0\n'
+            f'    repr{{\n'
+            f'        id, name\n'
+            f'    }}\n'
+            f'}}\n')
+
+
+def make_relation(left: str, kind: str, right: str, left_weight: int, right_weight: int, with_field: bool) -> str:
+    body = '    note: TextStr?\n' if with_field else ''
+    return f'{left}{"^" * left_weight} {kind} {right}{"^" * right_weight}{{\n{body}}}\n'
+
+
+def make_schema(n_tables: int, relations_per_kind: Optional[int] = None, owned: float = 0.2, seed: int = 0) -> str:
+    rand = Random(seed)
+    if relations_per_kind is None:
+        relations_per_kind = n_tables // 2
+    names = [table_name(i) for i in range(n_tables)]
+    chunks = [make_table(name) for name in names]
+
+    n_relations = min(relations_per_kind * len(RELATION_KINDS), n_tables * (n_tables - 1) // 2)
+    pairs = set()
+    while len(pairs) < n_relations:
+        i, j = sorted(rand.sample(range(n_tables), 2))
+        pairs.add((i, j))
+
+    for n, (i, j) in enumerate(sorted(pairs)):
+        kind = RELATION_KINDS[n % len(RELATION_KINDS)]
+        weight = 1 if rand.random() < owned else 0
+        with_field = rand.random() < 0.5
+        # 所有权在下标小的一侧, 随机决定它出现在左边还是右边
+        if rand.random() < 0.5:
+            chunks.append(make_relation(names[i], kind, names[j], weight, 0, with_field))
+        else:
+            chunks.append(make_relation(names[j], kind, names[i], 0, weight, with_field))
+    return '\n'.join(chunks)
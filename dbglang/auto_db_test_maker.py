@@ -1,4 +1,4 @@
-from random import shuffle, randint
+from random import Random
 from typing import Generator
 from itertools import permutations
 
@@ -8,9 +8,13 @@ class TestGenerateSession:
     text_str_gen: Generator
     info_str_gen: Generator
     int_stream: Generator
+    random: Random
 
-    def __new__(cls, *args, **kwargs):
-
+    def __new__(cls, seed=None):
+        """
+        seed: 相同的 seed 生成相同的样例, 代码生成时使用表名。
+        """
+        cls.random = Random(seed)
         cls.name_str_gen = cls.str_inst_generator_maker(4)
         cls.text_str_gen = cls.str_inst_generator_maker(5)
         cls.info_str_gen = cls.str_inst_generator_maker(6)
@@ -27,8 +31,9 @@ class TestGenerateSession:
 
     @classmethod
     def str_inst_generator_maker(cls, n: int):
-        words = permutations(
-            set('abcdefghijklmnopqrstuvwxyz'), n)
+        letters = list('abcdefghijklmnopqrstuvwxyz')
+        cls.random.shuffle(letters)
+        words = permutations(letters, n)
         for each in words:
             yield '"' + ''.join(each) + '"'
 
@@ -43,10 +48,10 @@ class TestGenerateSession:
     @classmethod
     def generate_inst_for_type(cls, x: str):
 
-        if x == 'Integer':
+        if x in ('Integer', 'BigInteger'):
             return next(cls.int_stream)
         elif x == 'SmallInteger':
-            return randint(1, 10)
+            return cls.random.randint(1, 10)
         elif x.startswith('String('):
             i = x[7:10]
             return {'20)': lambda: next(cls.name_str_gen),
@@ -54,7 +59,7 @@ class TestGenerateSession:
                     '200': lambda: next(cls.info_str_gen),
                     '500': lambda: next(cls.info_str_gen)}[i]()
         elif x.startswith('Date'):
-            r = cls.time_inst_maker(randint(1, 23))
+            r = cls.time_inst_maker(cls.random.randint(1, 23))
             if not x.endswith('Time'):
                 r = f'({r}).date()'
             return r
@@ -0,0 +1,157 @@
+"""
+dbgc 的编译缓存。
+
+以 输入文件内容、编译器版本(及源码)、import 参数 和 config 尾参数 的哈希为键,
+缓存生成的 out.py 与 out.test_samples.py。命中时直接复制缓存结果, 跳过解析与生成; 首行指纹相同的输出文件不重写。
+输入文件 import 的其他 .dbg 文件记录在键对应的清单中, 它们的内容也参与命中判断。
+
+此外, 每个 .dbg 文件单独编译出的 `link.Fragment` 以该文件内容的哈希为键缓存。
+
+命中缓存是 dbgc 最常见的路径, 本模块只在顶层导入启动时必需的标准库。
+"""
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional, Sequence
+from . import __version__
+from .fingerprint import read_fingerprint
+
+CACHE_DIR_ENV = 'DBGC_CACHE_DIR'
+
+# 不影响生成结果的选项, 不计入缓存键
+output_neutral_flags = {'no_cache', 'cache_dir', 'legacy_parser', 'jobs', 'watch', 'profile'}
+
+_compiler_digest: Optional[bytes] = None
+
+
+def compiler_digest() -> bytes:
+    """
+    编译器自身源码的哈希, 保证修改编译器后不会命中旧缓存。
+    """
+    global _compiler_digest
+    if _compiler_digest is None:
+        h = hashlib.sha256(__version__.encode())
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for filename in sorted(os.listdir(package_dir)):
+            if filename.endswith('.py') or filename == 'grammar':
+                h.update(filename.encode())
+                with open(os.path.join(package_dir, filename), 'rb') as f:
+                    h.update(f.read())
+        _compiler_digest = h.digest()
+    return _compiler_digest
+
+
+def file_digest(filename: str) -> str:
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def test_samples_file(out_file: str) -> str:
+    return os.path.splitext(out_file)[0] + '.test_samples.py'
+
+
+def default_cache_dir(input_file: str) -> str:
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.dirname(os.path.abspath(input_file)),
+                                                         '.dbgc_cache')
+
+
+class CompileCache:
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def key(self, input_file: str, imports: Dict[str, str], conf: Sequence[str], flags: Dict[str, object]) -> str:
+        h = hashlib.sha256(compiler_digest())
+        h.update(file_digest(input_file).encode())
+        h.update(json.dumps([sorted(imports.items()),
+                             list(conf),
+                             sorted((k, v) for k, v in flags.items() if k not in output_neutral_flags)],
+                            default=str).encode())
+        return h.hexdigest()
+
+    def entry(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def sources_key(self, key: str, sources: Sequence[str]) -> Optional[str]:
+        h = hashlib.sha256(key.encode())
+        for filename in sources:
+            if not os.path.exists(filename):
+                return None
+            h.update(filename.encode())
+            h.update(file_digest(filename).encode())
+        return h.hexdigest()
+
+    def restore(self, key: str, outputs: Sequence[str]) -> bool:
+        """
+        命中则把缓存写到 outputs, 内容已相同的文件不重写。
+        """
+        manifest = os.path.join(self.entry(key), 'sources')
+        if not os.path.exists(manifest):
+            return False
+        with open(manifest, encoding='utf8') as f:
+            sources_key = self.sources_key(key, json.load(f))
+        if sources_key is None:
+            return False
+        entry = self.entry(sources_key)
+        cached = [os.path.join(entry, str(i)) for i in range(len(outputs))]
+        if not all(map(os.path.exists, cached)):
+            return False
+        for src, dst in zip(cached, outputs):
+            digest = read_fingerprint(src)
+            if digest is not None and read_fingerprint(dst) == digest:
+                continue
+            shutil.copyfile(src, dst)
+        return True
+
+    def store(self, key: str, sources: Sequence[str], outputs: Sequence[str]) -> None:
+        """
+        sources: 参与编译的全部 .dbg 文件。
+        """
+        sources = sorted(sources)
+        entry = self.entry(self.sources_key(key, sources))
+        if not os.path.exists(entry):
+            import tempfile
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=os.path.dirname(entry))
+            try:
+                for i, src in enumerate(outputs):
+                    shutil.copyfile(src, os.path.join(tmp, str(i)))
+                os.replace(tmp, entry)
+            except OSError:
+                # 并发的 dbgc 已经写入了同一个键
+                shutil.rmtree(tmp, ignore_errors=True)
+
+        manifest = self.entry(key)
+        os.makedirs(manifest, exist_ok=True)
+        self.write_atomic(os.path.join(manifest, 'sources'), json.dumps(sources).encode())
+
+    def write_atomic(self, filename: str, data: bytes) -> None:
+        import tempfile
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, filename)
+
+    def fragment_key(self, filename: str, legacy: bool) -> str:
+        h = hashlib.sha256(compiler_digest())
+        h.update(b'legacy' if legacy else b'rdp')
+        h.update(file_digest(filename).encode())
+        return h.hexdigest()
+
+    def load_fragment(self, filename: str, legacy: bool = False):
+        path = os.path.join(self.entry(self.fragment_key(filename, legacy)), 'fragment')
+        if not os.path.exists(path):
+            return None
+        import pickle
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def store_fragment(self, filename: str, fragment, legacy: bool = False) -> None:
+        import pickle
+        entry = self.entry(self.fragment_key(filename, legacy))
+        os.makedirs(entry, exist_ok=True)
+        self.write_atomic(os.path.join(entry, 'fragment'), pickle.dumps(fragment, pickle.HIGHEST_PROTOCOL))
@@ -1,8 +1,14 @@
-from .table_info_gen import DBP
+from .table_info_gen import DBP, SchemaError, sql_table_name
+from .delete_plan import OwnershipGraph, make_delete_plan, orm_steps, entity_tables, DeletePlan, OrmStep
 from .parse import parse
-from typing import Dict
-from .auto_db_test_maker import TestGenerateSession
+from typing import Dict, Optional, Callable, Iterable, Iterator, List, Tuple
+from collections import defaultdict, deque
+from .cache import test_samples_file
+from .fingerprint import FingerprintWriter
+from .parallel import min_parallel_tables, process_count
+from .profiling import null_profiler
 import re
+import os
 
 Indent = '    '
 Indentn = '\n' + Indent
@@ -43,53 +49,242 @@ def relationship(reference_type_name: str, from_field: str, ref_field: str, use_
     return reference
 
 
+# 以下渲染函数只依赖参数, 可以在子进程中执行(见 `Analyzer(jobs=...)`)。
+
+def render_table(table_name: str, table: dict) -> str:
+    res = ("class {TableName}(Base, ITable):\n"
+           "{Indent}__tablename__ = '{table_name}'\n{table_args}\n"
+           "{Indent}# primary keys\n{Indent}{primaries}\n\n"
+           "{Indent}# fields\n{Indent}{fields}\n\n"
+           "{Indent}# relationship\n{Indent}{relations}\n\n"
+           "{Indent}# repr\n{Indent}def __repr__(self):\n{Indent}{Indent}return {repr}\n").format(
+
+        Indent=Indent,
+
+        TableName=table_name,
+
+        table_name=sql_table_name(table_name),
+
+        table_args=(f"{Indent}__table_args__ = (\n" +
+                    ''.join(f'{Indent * 2}{each},\n' for each in table['args']) +
+                    f"{Indent})\n") if table['args'] else '',
+
+        primaries=Indentn.join(f'{field_name} = Column({render_column(v)})' for field_name, v in
+
+                               table['primary'].items()),
+        fields=Indentn.join(f'{field_name} = Column({render_column(v)})' for field_name, v in
+                            table['field'].items()),
+
+        relations=Indentn.join(table['relation']),
+
+        repr=table['repr'])
+
+    return res
+
+
+def sample_rows(table_name: str, spec: Dict[str, dict], sample_num: int) -> Iterator[str]:
+    if not sample_num:
+        # `--samples=0` 时不导入样例生成器
+        yield f'{table_name}List = [\n{Indent*3}]'
+        return
+    from .auto_db_test_maker import TestGenerateSession
+    session = TestGenerateSession(table_name)
+
+    def format_attr(attr_name, attr_type):
+        return f'{attr_name}={session.generate_inst_for_type(attr_type)}'
+
+    def format_attrs(_spec):
+        return f', \n{Indent*3}'.join([format_attr(attr_name, more_info['__type__']) for attr_name, more_info in
+                                       _spec['primary'].items()] +
+                                      [format_attr(attr_name, more_info['__type__']) for attr_name, more_info in
+                                       _spec['field'].items()])
+
+    yield f'{table_name}List = [\n{Indent*3}'
+    for i in range(sample_num):
+        yield f',\n{Indent*3}{table_name}({format_attrs(spec)})' if i else f'{table_name}({format_attrs(spec)})'
+    yield ']'
+
+
+def render_samples(table_name: str, spec: Dict[str, dict], sample_num: int) -> str:
+    return ''.join(sample_rows(table_name, spec, sample_num))
+
+
+def render_batch(batch: List[Tuple[Callable[..., str], tuple]]) -> List[str]:
+    return [render(*args) for render, args in batch]
+
+
+def ordered_results(pool, tasks: List[Tuple[Callable[..., str], tuple]], jobs: int) -> Iterator[str]:
+    """
+    把 tasks 分批提交到进程池, 按提交顺序逐个返回结果; 同时在途的批次数有上限, 已完成的结果不会无限堆积。
+    """
+    batch_size = max(1, min(64, len(tasks) // (jobs * 4)))
+    window = jobs * 2
+    pending = deque()
+    for i in range(0, len(tasks), batch_size):
+        pending.append(pool.submit(render_batch, tasks[i:i + batch_size]))
+        if len(pending) >= window:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
 relation_delete_spec = ("@DeleteManager.Between({ManageType}, {DeleteType})\n"
                         "def delete_{delete_type}_from_{manage_type}(*relations) -> Optional[Seq[Tuple[Optional[dict], Optional[dict]]]]:\n"
                         "{codes}\n")
 
+_templates: Optional[List[str]] = None
+
+
+def load_templates() -> List[str]:
+    """
+    按 `##{name}##` 标记切分 templates.py: 偶数位置为原文, 奇数位置为标记名。
+    """
+    global _templates
+    if _templates is None:
+        with open(os.path.join(os.path.split(__file__)[0], 'templates.py')) as f:
+            _templates = re.split(r'##\{(\w+)\}##', f.read())
+    return _templates
+
+
 entity_delete_spec = ("@DeleteManager.For({EntityType})\n"
-                      "def delete_{entity_type}(entity) -> {RetType}:\n"
-                      "{codes}\n")
+                      "def delete_{entity_type}(entity) -> Dict[str, int]:\n"
+                      "{Indent}return run_delete_plan({EntityType}, (entity,))\n")
+
+bulk_insert_spec = ("def bulk_insert_{entity_type}(rows: Iterable[dict], batch_size: int = 1000) -> int:\n"
+                    "{Indent}\"\"\"\n"
+                    "{Indent}插入 {EntityType} 的行(列名 => 值), 每 batch_size 行一次 executemany, 不经过 ORM; 同一批的行须有相同的键。\n"
+                    "{Indent}返回插入的行数。\n"
+                    "{Indent}\"\"\"\n"
+                    "{Indent}return bulk_insert({EntityType}, rows, batch_size)\n")
+
+
+upsert_spec = ("def upsert_{entity_type}_by_{field}(rows: Iterable[dict], batch_size: int = 500) -> int:\n"
+               "{Indent}\"\"\"\n"
+               "{Indent}按唯一的 {field} 插入或更新 {EntityType}: {field} 已存在时以 rows 中给出的其他列更新该行(SQLite, PostgreSQL)。\n"
+               "{Indent}返回写入的行数。\n"
+               "{Indent}\"\"\"\n"
+               "{Indent}return upsert({EntityType}, '{field}', rows, batch_size)\n")
+
+
+def sqlite_engine_hooks(foreign_keys: bool) -> str:
+    """
+    pysqlite 在 DML 之前才隐式开始事务, SAVEPOINT(`begin_nested`, 见 `delete_<table>_chunked`) 不在事务中,
+    因此关闭 pysqlite 的事务处理, 由 SQLAlchemy 发出 BEGIN。
+    foreign_keys: SQLite 默认不检查外键, `ondelete` 需要在每个连接上打开 foreign_keys。
+    """
+    pragma = (f"{Indent}{Indent}cursor = dbapi_connection.cursor()\n"
+              f"{Indent}{Indent}cursor.execute('PRAGMA foreign_keys=ON')\n"
+              f"{Indent}{Indent}cursor.close()\n") if foreign_keys else ''
+    return ("if engine.dialect.name == 'sqlite':\n"
+            f"{Indent}@event.listens_for(engine, 'connect')\n"
+            f"{Indent}def sqlite_connect(dbapi_connection, connection_record):\n"
+            f"{Indent}{Indent}dbapi_connection.isolation_level = None\n"
+            f"{pragma}"
+            "\n"
+            f"{Indent}@event.listens_for(engine, 'begin')\n"
+            f"{Indent}def sqlite_begin(conn):\n"
+            f"{Indent}{Indent}conn.execute('BEGIN')\n")
+
+
+bulk_delete_spec = ("@DeleteManager.Bulk({EntityType})\n"
+                    "def bulk_delete_{entity_type}(ids: Iterable[int]) -> Dict[str, int]:\n"
+                    "{Indent}\"\"\"\n"
+                    "{Indent}删除 id 在 ids 中的 {EntityType} 及其拥有的对象, 不加载实例, 每条语句处理一批 id。返回各表删除的行数。\n"
+                    "{Indent}\"\"\"\n"
+                    "{codes}\n")
+
+
+chunked_delete_spec = ("@DeleteManager.Chunked({EntityType})\n"
+                       "def delete_{entity_type}_chunked(entity, chunk_size: int = 500, progress: Optional[Progress] = None,\n"
+                       "{pad}commit: bool = False) -> Dict[str, int]:\n"
+                       "{Indent}\"\"\"\n"
+                       "{Indent}删除 entity 及其拥有的对象, 被拥有的表在前, 每批 chunk_size 个 id, 在各自的 SAVEPOINT 中执行。\n"
+                       "{Indent}每批之后调用 progress(表名, 已删除数, 总数); commit 为真时每批之后提交, 不长时间持有锁。\n"
+                       "{Indent}\"\"\"\n"
+                       "{codes}\n")
+
+
+# templates.py 中定义的表: 类名 => 表名
+RESERVED_TABLES = {'DeleteQueue': 'dbg_delete_queue', 'HiLoBlock': 'dbg_hilo'}
+
+
+def owned_ids(table_name: str) -> str:
+    return f'{sql_table_name(table_name)}_ids'
 
 
 class Analyzer:
 
-    def __init__(self, dbp: DBP, *conf: str, **custom_libs):
+    def __init__(self, dbp: DBP, *conf: str, memo: Optional[dict] = None, profiler=null_profiler,
+                 sample_num: int = 500, jobs: Optional[int] = None, **custom_libs):
+        """
+        memo: 跨多次 generate 复用的渲染结果(见 `watch`), 只有定义变化了的表会被重新渲染。
+        profiler: 统计各阶段耗时, 见 `profiling.Profiler`。
+        sample_num: 每个表生成的测试样例数。
+        jobs: 见 `parallel.process_count`; 多于 1 个进程时各表的定义与测试样例在进程池中渲染。
+        """
         self.dbp = dbp
+        self.sample_num = sample_num
+        self.jobs = process_count(jobs)
+        self.parallel_tables = 2 if jobs is not None else min_parallel_tables
+        self._pool = None
         self.config_codes = conf
         self.custom_libs = custom_libs
+        self.memo = memo
+        self.profiler = profiler
+        self._used_memo = {}
+
+    def memoized(self, key: tuple, make: Callable[[], Iterable[str]]) -> Iterable[str]:
+        """
+        make 产生渲染结果的各个片段。没有 memo 时直接返回这些片段, 不在内存中保留。
+        """
+        if self.memo is None:
+            return make()
+        ret = self.memo.get(key)
+        if ret is None:
+            ret = ''.join(make())
+        self._used_memo[key] = ret
+        return ret,
+
+    def render(self, tasks: List[Tuple[tuple, Callable[..., str], tuple]],
+               stream: Callable[..., Iterable[str]]) -> Iterator[Iterable[str]]:
+        """
+        tasks: (memo 键, 渲染函数, 参数); 按 tasks 的顺序为每个任务返回其结果的各个片段。
+        有进程池时未命中 memo 的任务交给进程池, 否则在本进程中以 stream(*参数) 逐片段渲染。
+        """
+        if self._pool is None:
+            for key, _, args in tasks:
+                yield self.memoized(key, lambda: stream(*args))
+            return
+
+        memo = self.memo if self.memo is not None else {}
+        results = ordered_results(self._pool, [(render, args) for key, render, args in tasks if key not in memo],
+                                  self.jobs)
+        for key, _, _ in tasks:
+            ret = memo[key] if key in memo else next(results)
+            if self.memo is not None:
+                self._used_memo[key] = ret
+            yield ret,
 
     def generate_table(self, table_name, table: dict) -> str:
+        return render_table(table_name, table)
 
-        res = ("class {TableName}(Base, ITable):\n"
-               "{Indent}__tablename__ = '{table_name}'\n\n"
-               "{Indent}# primary keys\n{Indent}{primaries}\n\n"
-               "{Indent}# fields\n{Indent}{fields}\n\n"
-               "{Indent}# relationship\n{Indent}{relations}\n\n"
-               "{Indent}# repr\n{Indent}def __repr__(self):\n{Indent}{Indent}return {repr}\n").format(
-
-            Indent=Indent,
-
-            TableName=table_name,
-
-            table_name='_'.join(map(str.lower, re.findall('[A-Z][a-z_]*', table_name))),
-
-            primaries=Indentn.join(f'{field_name} = Column({render_column(v)})' for field_name, v in
-
-                                   table['primary'].items()),
-            fields=Indentn.join(f'{field_name} = Column({render_column(v)})' for field_name, v in
-                                table['field'].items()),
-
-            relations=Indentn.join(table['relation']),
-
-            repr=table['repr'])
-
-        return res
+    def is_foreign_key_relation(self, left: str, right: str) -> bool:
+        return right in self.dbp.ForeignKeys.get(left, ()) or left in self.dbp.ForeignKeys.get(right, ())
 
     def make_relation_delete(self, manage_type: str, delete_type: str):
         delete_field_of_relation = self.dbp.RelationSpecForDestruction[manage_type].get(delete_type)
 
-        if not delete_field_of_relation:
+        if self.is_foreign_key_relation(manage_type, delete_type):
+            # 存为外键列的关系: relations 是另一端的实体, 没有关联表的行可删
+            if delete_field_of_relation:
+                codes = f"{Indent}return tuple((None, delete_{delete_type.lower()}(each)) for each in relations)\n"
+            elif manage_type in self.dbp.ForeignKeys.get(delete_type, ()):
+                codes = (f"{Indent}for each in relations:\n"
+                         f"{Indent*2}each.{self.dbp.ForeignKeys[delete_type][manage_type]} = None\n"
+                         f"{Indent}return None")
+            else:
+                codes = f"{Indent}return None"
+        elif not delete_field_of_relation:
             codes = (f"{Indent}normal_delete_relations(*relations)\n"
                      f"{Indent}return None")
         else:
@@ -108,75 +303,156 @@ class Analyzer:
                                            codes=codes)
 
     def make_entity_delete(self, entity_type: str):
-        relations_to_delete = self.dbp.RelationSpec[entity_type]
-
-        if not relations_to_delete:
-            codes = f"{Indent}{entity_type}.query.filter_by(id=entity.id) if hasattr(entity, 'id') else db_session.delete(entity)\n"
-            ret_type = 'None'
-        else:
-            lower_case_entity_type_name = entity_type.lower()
-            key_list = []
-
-            for each in relations_to_delete:
-                relations = f'entity.{self.dbp.RefTable[entity_type][each.capitalize()]}'
-                elem = f"'{each}': delete_{each}_from_{lower_case_entity_type_name}(*{relations})"
-                key_list.append(elem)
-            content=f',\n{Indent*3}'.join(key_list)
-            codes = (f'{Indent}ret = {{{content}}}\n'
-                     f"{Indent}{entity_type}.query.filter_by(id=entity.id) if hasattr(entity, 'id') else db_session.delete(entity)\n"
-                     f'{Indent}return ret')
-            ret_type = 'Optional[Dict]'
-
-        return entity_delete_spec.format(codes=codes,
-                                         RetType=ret_type,
-                                         EntityType=entity_type,
-                                         entity_type='_'.join(map(str.lower, re.findall('[A-Z][a-z_]*', entity_type))))
+        return entity_delete_spec.format(Indent=Indent, EntityType=entity_type, entity_type=sql_table_name(entity_type))
+
+    def make_delete_plans(self, steps: Dict[str, List[OrmStep]]) -> Iterator[str]:
+        def render_step(step: OrmStep) -> str:
+            args = [step.table, repr(step.action), repr(step.attribute)]
+            if step.target:
+                args.append(step.target)
+            if step.field:
+                args.append(repr(step.field))
+            return f'DeleteStep({", ".join(args)})'
+
+        # 各表的删除步骤, 由 `run_delete_plan` 执行
+        yield 'DeletePlans: Dict[type, Tuple[DeleteStep, ...]] = {\n'
+        for table, each in steps.items():
+            content = ''.join(f'\n{Indent * 2}{render_step(step)},' for step in each)
+            yield f'{Indent}{table}: ({content}\n{Indent}),\n' if content else f'{Indent}{table}: (),\n'
+        yield '}\n'
+
+    def select_owned_ids(self, entity_type: str, plan: DeletePlan) -> List[str]:
+        """
+        沿所有权取出各表要删除的 id, `<table>_ids` 已是 entity_type 要删除的 id。
+        """
+        codes = []
+        selected = {entity_type}
+        for each in plan.selects:
+            op = '|=' if each.target in selected else '='
+            selected.add(each.target)
+            codes.append(f'{owned_ids(each.target)} {op} select_ids({each.table}.{each.column}, {each.table}.{each.key}, '
+                         f'{owned_ids(each.source)})')
+        return codes
+
+    def make_bulk_delete(self, entity_type: str, plan: DeletePlan) -> str:
+        codes = [f'{owned_ids(entity_type)} = set(ids)', *self.select_owned_ids(entity_type, plan)]
+        codes.append('deleted = defaultdict(int)')
+        codes.extend(f'delete_in(deleted, {each.table}.{each.column}, {owned_ids(each.source)})' for each in plan.unlinks)
+        codes.extend(f'nullify_in({each.table}.{each.column}, {owned_ids(each.source)})' for each in plan.nullifies)
+        codes.extend(f'delete_in(deleted, {each}.id, {owned_ids(each)})' for each in plan.deletes)
+        codes.append('return dict(deleted)')
+        return bulk_delete_spec.format(Indent=Indent, EntityType=entity_type, entity_type=sql_table_name(entity_type),
+                                       codes='\n'.join(f'{Indent}{each}' for each in codes))
+
+    def make_chunked_delete(self, entity_type: str, plan: DeletePlan) -> str:
+        """
+        plan 不依赖外键的 `ondelete`, 每批语句涉及的行数有界。
+        被拥有的表先于拥有者删除, 中途失败时不留下无主的行, 重新执行即可继续。
+        """
+
+        def columns(statements) -> str:
+            items = [f'{each.table}.{each.column}' for each in statements]
+            return f'({items[0]},)' if len(items) == 1 else f'({", ".join(items)})'
+
+        unlinks_of = defaultdict(list)
+        for each in plan.unlinks:
+            unlinks_of[each.source].append(each)
+        nullifies_of = defaultdict(list)
+        for each in plan.nullifies:
+            nullifies_of[each.source].append(each)
+
+        codes = ['db_session.flush()', f'{owned_ids(entity_type)} = {{entity.id}}',
+                 *self.select_owned_ids(entity_type, plan), 'deleted = defaultdict(int)']
+        for table in reversed(plan.deletes):
+            unlinks = columns(unlinks_of[table])
+            nullifies = columns(nullifies_of[table])
+            codes.append(f'delete_in_batches(deleted, {table}, {owned_ids(table)}, {unlinks}, {nullifies}, '
+                         f'chunk_size, progress, commit)')
+        codes.append('return dict(deleted)')
+        name = f'delete_{sql_table_name(entity_type)}_chunked'
+        return chunked_delete_spec.format(Indent=Indent, EntityType=entity_type, pad=' ' * len(f'def {name}('),
+                                          entity_type=sql_table_name(entity_type),
+                                          codes='\n'.join(f'{Indent}{each}' for each in codes))
 
     def generate(self, out_file: str):
-
-        import os
-
-        def generate_data(table_name: str, spec: Dict[str, dict]):
-            session = TestGenerateSession()
-            sample_num = 500
-
-            def format_attr(attr_name, attr_type):
-                return f'{attr_name}={session.generate_inst_for_type(attr_type)}'
-
-            def format_attrs(_spec):
-                return f', \n{Indent*3}'.join([format_attr(attr_name, more_info['__type__']) for attr_name, more_info in
-                                               _spec['primary'].items()] +
-                                              [format_attr(attr_name, more_info['__type__']) for attr_name, more_info in
-                                               _spec['field'].items()])
-
-            return "{}List = [\n{}{}]".format(table_name,
-                                              Indent * 3,
-                                              f',\n{Indent*3}'
-                                              .join([f'{table_name}({format_attrs(spec)})'
-                                                     for _ in range(sample_num)]))
-
-        with open(os.path.splitext(out_file)[0] + '.test_samples.py', 'w') as f:
-            f.write('from random import randint\n'
-                    'from datetime import datetime, timedelta\n' +
-                    '\n'.join(generate_data(k, v) for k, v in self.dbp.tables.items()))
-
-        table_def_codes = '\n'.join(self.generate_table(k, v) for k, v in self.dbp.tables.items())
-
-        entity_delete_codes = '\n'.join(self.make_entity_delete(k) for k in self.dbp.tables)
-
-        relation_delete_codes = '\n'.join(
-            self.make_relation_delete(k, v.capitalize()) for k, vs in self.dbp.RelationSpec.items() for v in vs)
-
-        with open(os.path.join(os.path.split(__file__)[0], 'templates.py')) as f:
-            templates = f.read()
-
-        codes = templates.replace('##{config}##', ''.join(self.config_codes)
-                                  ).replace('##{table_def}##', table_def_codes
-                                            ).replace('##{methods}##', f'{entity_delete_codes}\n{relation_delete_codes}'
-                                                      ).replace('##{custom_lib}##', '\n'.join(
-            f'from {_from} import {_import}' for _import, _from in self.custom_libs.items()))
+        """
+        边生成边写入: 每个表定义、删除函数和测试样例块产生后立即写入输出文件,
+        内存占用不随表的数量和样例数增长。
+        各阶段的耗时包含写入该阶段产生的内容; `write` 为模板其余部分的写入。
+        """
+
+        profiler = self.profiler
+
+        def column_types(spec: dict) -> tuple:
+            return tuple((attr_name, more_info['__type__']) for attr_name, more_info in
+                         (*spec['primary'].items(), *spec['field'].items()))
+
+        def test_samples() -> Iterator[str]:
+            yield ('from random import randint\n'
+                   'from datetime import datetime, timedelta\n')
+            tasks = [(('samples', k, self.sample_num, column_types(v)), render_samples, (k, v, self.sample_num))
+                     for k, v in self.dbp.tables.items()]
+            for i, chunks in enumerate(self.render(tasks, sample_rows)):
+                if i:
+                    yield '\n'
+                yield from chunks
+
+        def table_defs() -> Iterator[str]:
+            tasks = [(('table', k, repr(v)), render_table, (k, v)) for k, v in self.dbp.tables.items()]
+            for i, chunks in enumerate(self.render(tasks, lambda k, v: (self.generate_table(k, v),))):
+                if i:
+                    yield '\n'
+                yield from chunks
+
+        for name in self.dbp.tables:
+            if name in RESERVED_TABLES or sql_table_name(name) in RESERVED_TABLES.values():
+                raise SchemaError(f'table {name} conflicts with a generated table '
+                                  f'({", ".join(f"{k}: {v}" for k, v in RESERVED_TABLES.items())})')
+
+        # 删除计划在写入任何文件之前算出, 所有权成环时抛出 OwnershipCycle(SchemaError)
+        with profiler.phase('delete functions'):
+            graph = OwnershipGraph(self.dbp)
+            steps = {k: orm_steps(graph, k) for k in self.dbp.tables}
+            plans = {k: make_delete_plan(graph, k) for k in entity_tables(self.dbp)}
+            chunked_plans = {k: make_delete_plan(graph, k, cascade=False) for k in plans}
+
+        def methods() -> Iterator[str]:
+            for i, k in enumerate(self.dbp.tables):
+                if i:
+                    yield '\n'
+                yield self.make_entity_delete(k)
+            yield '\n'
+            first = True
+            for k, vs in self.dbp.RelationSpec.items():
+                for v in sorted(vs):
+                    if not first:
+                        yield '\n'
+                    first = False
+                    yield self.make_relation_delete(k, v.capitalize())
+            yield '\n'
+            yield from self.make_delete_plans(steps)
+            for k, plan in plans.items():
+                yield '\n'
+                yield self.make_bulk_delete(k, plan)
+            for k, plan in chunked_plans.items():
+                yield '\n'
+                yield self.make_chunked_delete(k, plan)
+            for k in self.dbp.tables:
+                yield '\n'
+                yield bulk_insert_spec.format(Indent=Indent, EntityType=k, entity_type=sql_table_name(k))
+            for k, v in self.dbp.tables.items():
+                # `!` 字段; `--fk-relations` 的一对一外键列虽然唯一, 不作为 upsert 的键
+                foreign_keys = set(self.dbp.ForeignKeys.get(k, {}).values())
+                for field, spec in v['field'].items():
+                    if spec.get('unique') and field not in foreign_keys:
+                        yield '\n'
+                        yield upsert_spec.format(Indent=Indent, EntityType=k, entity_type=sql_table_name(k),
+                                                 field=field)
 
         def rec(v, symbol):
+            if isinstance(v, set):
+                # 集合按元素排序输出, 生成结果不受哈希随机化影响
+                return '{{{}}}'.format(', '.join(map(repr, sorted(v)))) if v else 'set()'
             return key_to_eval(v, symbol=symbol) if isinstance(v, dict) else f'"{v}"' if not symbol and isinstance(v,
                                                                                                                    str) else v
 
@@ -184,12 +460,57 @@ class Analyzer:
             dic = dict(dic)
             return '{{{}}}'.format(", ".join(f'{k}: {rec(v, symbol)}' for k, v in dic.items()))
 
-        for_inspection = ("\nRefTable = {}\n".format(key_to_eval(self.dbp.RefTable)),
-                          "RelationSpec = {}\n".format(key_to_eval(self.dbp.RelationSpec)),
-                          "RelationSpecForDestruction = {}\n".format(key_to_eval(self.dbp.RelationSpecForDestruction)),
-                          'LRType = {}\n'.format(key_to_eval(self.dbp.LRType, symbol=True)),
-                          'LRRef = {}\n'.format(key_to_eval(self.dbp.LRRef)),
-                          'FieldSpec = {}\n'.format(key_to_eval(self.dbp.FieldSpec)))
-
-        with open(out_file, 'w') as f:
-            f.write(codes + '\n'.join(for_inspection))
+        def for_inspection() -> Iterator[str]:
+            for name, dic, symbol in (('RefTable', self.dbp.RefTable, False),
+                                      ('RelationSpec', self.dbp.RelationSpec, False),
+                                      ('RelationSpecForDestruction', self.dbp.RelationSpecForDestruction, False),
+                                      ('LRType', self.dbp.LRType, True),
+                                      ('LRRef', self.dbp.LRRef, False),
+                                      ('FieldSpec', self.dbp.FieldSpec, False),
+                                      ('ForeignKeys', self.dbp.ForeignKeys, False)):
+                yield f'\n{name} = {{'
+                # 逐个表写出, 不拼接整个字典
+                for j, (k, v) in enumerate(dict(dic).items()):
+                    yield f'{k}: {rec(v, symbol)}' if j == 0 else f', {k}: {rec(v, symbol)}'
+                yield '}\n'
+
+        sections = {
+            'config': (lambda: self.config_codes, 'write'),
+            'custom_lib': (lambda: ('\n'.join(f'from {_from} import {_import}'
+                                              for _import, _from in self.custom_libs.items()),), 'write'),
+            'engine_events': (lambda: (sqlite_engine_hooks(self.dbp.db_cascade),), 'write'),
+            'table_def': (table_defs, 'generate_table'),
+            'methods': (methods, 'delete functions'),
+        }
+
+        self._used_memo = {}
+        if self.jobs > 1 and len(self.dbp.tables) >= self.parallel_tables:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(self.jobs)
+        try:
+            with FingerprintWriter(test_samples_file(out_file)) as out:
+                with profiler.phase('test samples'):
+                    for chunk in test_samples():
+                        out.write(chunk)
+
+            with FingerprintWriter(out_file) as out:
+                for i, part in enumerate(load_templates()):
+                    if i % 2 == 0:
+                        with profiler.phase('write'):
+                            out.write(part)
+                        continue
+                    make, phase = sections[part]
+                    with profiler.phase(phase):
+                        for chunk in make():
+                            out.write(chunk)
+                with profiler.phase('write'):
+                    for chunk in for_inspection():
+                        out.write(chunk)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+        if self.memo is not None:
+            self.memo.clear()
+            self.memo.update(self._used_memo)
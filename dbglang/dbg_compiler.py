@@ -1,9 +1,45 @@
-from .parse import parse
-from .table_info_gen import DBP
-from .code_gen import Analyzer
+"""
+dbgc 的入口。
 
+命中缓存时只需要 `cache` 模块; 解析、链接与代码生成相关的模块在未命中时才导入,
+使缓存命中的构建保持在几十毫秒以内(见 benchmarks/bench_startup.py)。
+"""
+from .cache import CompileCache, default_cache_dir, test_samples_file
+import sys
 
-def compile(*args):
+
+def split_flags(args):
+    """
+    从命令行参数中取出 `--name` / `--name=value` 形式的选项。
+    """
+    flags = {}
+    rest = []
+    for arg in args:
+        if arg.startswith('--'):
+            name, _, value = arg[2:].partition('=')
+            flags[name.replace('-', '_')] = value or True
+        else:
+            rest.append(arg)
+    return flags, tuple(rest)
+
+
+def analyzer_options(flags) -> dict:
+    """
+    命令行选项中影响代码生成的部分, 转为 `Analyzer` 的关键字参数。
+    """
+    options = {}
+    if 'samples' in flags:
+        options['sample_num'] = int(flags['samples'])
+    if 'jobs' in flags:
+        options['jobs'] = int(flags['jobs'])
+    return options
+
+
+def compile(*args, profiler=None):
+    """
+    profiler: `profiling.Profiler`, 传入时统计各阶段的耗时与内存峰值; 此时不读取输出与各文件的缓存, 每个阶段都实际执行。
+    命令行中对应 `--profile`(把报告打印到 stderr) 或 `--profile=<file>`(另外把 cProfile 结果写入 file)。
+    """
     if 'import' in args:
         idx = args.index('import')
         imports = args[idx + 1:]
@@ -11,14 +47,9 @@ def compile(*args):
         args = args[:idx]
     else:
         imports = {}
+    flags, args = split_flags(args)
     input_file, out_file, *tail = args
 
-    stmts = parse(input_file)
-
-    handler = DBP()
-
-    handler.ast_for_stmts(stmts)
-
     if tail:
 
         conf = tail
@@ -26,4 +57,59 @@ def compile(*args):
 
         conf = ()
 
-    Analyzer(handler, *conf, **imports).generate(out_file)
+    outputs = (out_file, test_samples_file(out_file))
+    cache = None
+    if not flags.get('no_cache'):
+        cache = CompileCache(flags.get('cache_dir') or default_cache_dir(input_file))
+
+    if flags.get('watch'):
+        from .watch import Watcher
+        interval = flags['watch']
+        Watcher(input_file, out_file, conf, imports, flags, cache).run(
+            0.5 if interval is True else float(interval))
+        return
+
+    profile = flags.get('profile')
+    if profile and profiler is None:
+        from .profiling import Profiler
+        profiler = Profiler()
+
+    if cache:
+        key = cache.key(input_file, imports, conf, flags)
+        if profiler is None and cache.restore(key, outputs):
+            return
+
+    c_profile = None
+    if isinstance(profile, str):
+        import cProfile
+        c_profile = cProfile.Profile()
+        c_profile.enable()
+
+    # 无论是否带 `--profile`, 编译过程中开启的 tracemalloc / cProfile 都在返回前关闭
+    try:
+        from .link import build
+        from .code_gen import Analyzer
+        from .profiling import null_profiler
+
+        jobs = int(flags['jobs']) if 'jobs' in flags else None
+        handler, sources = build(input_file, jobs=jobs, cache=cache, legacy=flags.get('legacy_parser', False),
+                                 profiler=profiler or null_profiler, lazy=flags.get('lazy'),
+                                 fk_relations=bool(flags.get('fk_relations')),
+                                 db_cascade=bool(flags.get('db_cascade')))
+
+        Analyzer(handler, *conf, profiler=profiler or null_profiler, **analyzer_options(flags), **imports).generate(
+            out_file)
+    finally:
+        if c_profile:
+            c_profile.disable()
+        if profiler is not None:
+            profiler.stop()
+
+    if c_profile:
+        c_profile.dump_stats(profile)
+
+    if cache:
+        cache.store(key, sources, outputs)
+
+    if profile:
+        print(profiler.report(), file=sys.stderr)
@@ -16,6 +16,7 @@ TableDef = AstParser(
     [Ref('Symbol'), LiteralParser('(', name='\'(\''), Ref('PrimaryDefList'), LiteralParser(')', name='\')\''),
      SeqParser([LiteralParser('\n', name='\'\n\'')]), LiteralParser('{', name='\'{\''),
      SeqParser([LiteralParser('\n', name='\'\n\'')]), Ref('FieldDefList'),
+     SeqParser([Ref('IndexDef'), SeqParser([LiteralParser('\n', name='\'\n\'')])]),
      SeqParser([Ref('ReprDef'), SeqParser([LiteralParser('\n', name='\'\n\'')])], atmost=1),
      LiteralParser('}', name='\'}\'')], name='TableDef', toIgnore=[{}, {'{', '}', '(', ')', '\n'}])
 FieldDef = AstParser([Ref('Symbol'), LiteralParser(':', name='\':\''), Ref('Type')], name='FieldDef',
@@ -24,7 +25,8 @@ Type = AstParser([Ref('Symbol'), SeqParser([Ref('Option')]),
                   SeqParser([LiteralParser('=', name='\'=\''), Ref('Default')], atmost=1)], name='Type',
                  toIgnore=[{}, {'='}])
 Option = AstParser([LiteralParser('?', name='\'?\'')], [LiteralParser('!', name='\'!\'')],
-                   [LiteralParser('~', name='\'~\'')], name='Option')
+                   [LiteralParser('~', name='\'~\''), SeqParser([Ref('Symbol')], atmost=1)],
+                   [LiteralParser('@', name='\'@\'')], name='Option')
 Default = AstParser([SeqParser([LiteralParser('.+', name='\'.+\'', isRegex=True)], atleast=1)], name='Default')
 ReprDef = AstParser([LiteralParser('repr', name='\'repr\''), DependentAstParser(
     [LiteralParser('{', name='\'{\''), SeqParser([LiteralParser('\n', name='\'\n\'')]), Ref('SymbolList'),
@@ -33,6 +35,18 @@ ReprDef = AstParser([LiteralParser('repr', name='\'repr\''), DependentAstParser(
                     toIgnore=[{}, {'=', '{', '}', 'all', 'repr', '\n'}])
 SymbolList = AstParser([Ref('Symbol'), SeqParser([LiteralParser(',', name='\',\''), Ref('Symbol')])], name='SymbolList',
                        toIgnore=[{}, {','}])
+IndexDef = AstParser(
+    [DependentAstParser([LiteralParser('index', name='\'index\'')], [LiteralParser('unique', name='\'unique\'')]),
+     LiteralParser('{', name='\'{\''), SeqParser([LiteralParser('\n', name='\'\n\'')]), Ref('SymbolList'),
+     SeqParser([LiteralParser('\n', name='\'\n\'')]), LiteralParser('}', name='\'}\''),
+     SeqParser([Ref('IncludeDef')], atmost=1), SeqParser([Ref('WhereDef')], atmost=1)], name='IndexDef',
+    toIgnore=[{}, {'{', '}', '\n'}])
+IncludeDef = AstParser([LiteralParser('include', name='\'include\''), LiteralParser('{', name='\'{\''),
+                        SeqParser([LiteralParser('\n', name='\'\n\'')]), Ref('SymbolList'),
+                        SeqParser([LiteralParser('\n', name='\'\n\'')]), LiteralParser('}', name='\'}\'')],
+                       name='IncludeDef', toIgnore=[{}, {'include', '{', '}', '\n'}])
+WhereDef = AstParser([LiteralParser('where', name='\'where\''), Ref('Default')], name='WhereDef',
+                     toIgnore=[{}, {'where'}])
 Comment = AstParser([LiteralParser('#', name='\'#\''), Ref('Default')], name='Comment')
 Symbol = AstParser([LiteralParser('[a-zA-Z][a-zA-Z_]*', name='\'[a-zA-Z][a-zA-Z_]*\'', isRegex=True)], name='Symbol')
 WeightedSymbol = AstParser([Ref('Symbol'), SeqParser([LiteralParser('^', name='\'^\'')])], name='WeightedSymbol')
@@ -40,11 +54,18 @@ Relation = AstParser(
     [Ref('WeightedSymbol'), Ref('Left'), LiteralParser('-', name='\'-\''), Ref('Right'), Ref('WeightedSymbol'),
      SeqParser([LiteralParser('\n', name='\'\n\'')]), LiteralParser('{', name='\'{\''),
      SeqParser([LiteralParser('\n', name='\'\n\'')]), SeqParser([Ref('FieldDefList')], atmost=1),
+     SeqParser([Ref('LazyDef'), SeqParser([LiteralParser('\n', name='\'\n\'')])], atmost=1),
      LiteralParser('}', name='\'}\'')], name='Relation', toIgnore=[{}, {'-', '}', '{', '\n'}])
+LazyDef = AstParser([LiteralParser('lazy', name='\'lazy\''), LiteralParser('=', name='\'=\''), Ref('Symbol')],
+                    name='LazyDef', toIgnore=[{}, {'lazy', '='}])
 Left = AstParser([SeqParser([LiteralParser('<', name='\'<\'')], atleast=1, atmost=2)], name='Left')
 Right = AstParser([SeqParser([LiteralParser('>', name='\'>\'')], atleast=1, atmost=2)], name='Right')
+Import = AstParser([LiteralParser('import', name='\'import\''), Ref('Symbol'),
+                    SeqParser([LiteralParser('.', name='\'.\''), Ref('Symbol')])], name='Import',
+                   toIgnore=[{}, {'import', '.'}])
 Stmts = AstParser(
-    [SeqParser([DependentAstParser([LiteralParser('\n', name='\'\n\'')], [Ref('Relation')], [Ref('TableDef')])])],
+    [SeqParser([DependentAstParser([LiteralParser('\n', name='\'\n\'')], [Ref('Import')], [Ref('Relation')],
+                                   [Ref('TableDef')])])],
     name='Stmts', toIgnore=[{}, {'\n'}])
 PrimaryDefList.compile(namespace, recurSearcher)
 FieldDefList.compile(namespace, recurSearcher)
@@ -55,10 +76,15 @@ Option.compile(namespace, recurSearcher)
 Default.compile(namespace, recurSearcher)
 ReprDef.compile(namespace, recurSearcher)
 SymbolList.compile(namespace, recurSearcher)
+IndexDef.compile(namespace, recurSearcher)
+IncludeDef.compile(namespace, recurSearcher)
+WhereDef.compile(namespace, recurSearcher)
 Comment.compile(namespace, recurSearcher)
 Symbol.compile(namespace, recurSearcher)
 WeightedSymbol.compile(namespace, recurSearcher)
 Relation.compile(namespace, recurSearcher)
+LazyDef.compile(namespace, recurSearcher)
 Left.compile(namespace, recurSearcher)
 Right.compile(namespace, recurSearcher)
+Import.compile(namespace, recurSearcher)
 Stmts.compile(namespace, recurSearcher)
@@ -0,0 +1,210 @@
+"""
+编译时计算的删除计划。
+
+删除表 root 的一组实体时, 按 RelationSpecForDestruction 找出它们(直接或间接)拥有的全部对象,
+得到固定的语句序列, 每条语句以 `IN (...)` 处理一批 id, 不加载实例:
+
+1. 按所有权的拓扑顺序, 沿每条所有权边 `SELECT` 得到各表要删除的 id;
+2. 删除这些 id 在关联表中的行, 把其他表中指向它们的外键置空;
+3. 删除各表的实体。
+
+外键带 `ondelete` 时(`DBP.db_cascade`), 第 2 步以及被拥有的一方持有外键、随拥有者级联删除的表由数据库完成,
+计划中只保留数据库无法级联的部分。
+
+各表的 id 先取出再删除: 关联表的行既是查找被拥有对象的依据, 又因外键约束必须先于实体删除,
+不能在后续语句中以子查询重复读取。
+
+`delete_<table>` 逐个实例删除时执行同一拓扑顺序下的 `OrmStep` 序列(见 `orm_steps`), 由生成代码中的
+`run_delete_plan` 迭代执行, 不递归。所有权成环时编译报错(`OwnershipCycle`)。
+"""
+from collections import defaultdict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from .table_info_gen import DBP, SchemaError
+
+
+class Select(NamedTuple):
+    # ids[target] |= SELECT table.column WHERE table.key IN ids[source]
+    target: str
+    table: str
+    column: str
+    key: str
+    source: str
+
+
+class Unlink(NamedTuple):
+    # DELETE FROM table WHERE column IN ids[source]
+    table: str
+    column: str
+    source: str
+
+
+class Nullify(NamedTuple):
+    # UPDATE table SET column = NULL WHERE column IN ids[source]
+    table: str
+    column: str
+    source: str
+
+
+class DeletePlan(NamedTuple):
+    root: str
+    order: List[str]
+    selects: List[Select]
+    unlinks: List[Unlink]
+    nullifies: List[Nullify]
+    # 需要执行 DELETE 的表, 拥有者在前
+    deletes: List[str]
+
+
+class OrmStep(NamedTuple):
+    # 对 table 的每个待删除实例 e, 依 action 处理 e.attribute:
+    #   unlink       删除关联表的行
+    #   own_through  删除关联表的行, 行的 field 属性(target 的实例)待删除
+    #   own          target 的实例(列表)待删除
+    #   own_one      target 的实例(至多一个)待删除
+    #   nullify      把这些实例的外键列 field 置空
+    table: str
+    action: str
+    attribute: str
+    target: Optional[str] = None
+    field: Optional[str] = None
+
+
+class OwnershipCycle(SchemaError):
+
+    def __init__(self, cycle: List[str]):
+        super().__init__(f'ownership cycle {" -> ".join(cycle)}')
+        self.cycle = cycle
+
+
+def owned_edges(dbp: DBP, owner: str) -> Iterator[Tuple[str, str, str, str]]:
+    """
+    owner 拥有的每个表: (被拥有的表, 查询的表, 被拥有一侧的 id 列, owner 一侧的 id 列)。
+    查询的表为被拥有的表本身时, 被拥有的一方持有指向 owner 的外键。
+    """
+    for owned in sorted(dbp.RelationSpecForDestruction.get(owner, ())):
+        through = dbp.LRType.get(owner, {}).get(owned)
+        if through:
+            yield owned, through, f'{owned.lower()}_id', f'{owner.lower()}_id'
+        elif owned in dbp.ForeignKeys.get(owner, {}):
+            yield owned, owner, dbp.ForeignKeys[owner][owned], 'id'
+        else:
+            yield owned, owned, 'id', dbp.ForeignKeys[owned][owner]
+
+
+class OwnershipGraph:
+    """
+    一个 schema 的所有权边以及各表的 SELECT / 关联表 DELETE / 外键置空语句, 构造时算出一次, 供各表的删除计划共用;
+    各表的删除顺序与 ORM 步骤在第一次用到时算出并保留。
+    """
+
+    def __init__(self, dbp: DBP):
+        self.dbp = dbp
+        self.edges: Dict[str, List[Tuple[str, str, str, str]]] = {
+            owner: list(owned_edges(dbp, owner)) for owner in dbp.RelationSpecForDestruction}
+        # 以下按表给出删除计划中与该表有关的语句, 计划只需按删除顺序拼接
+        self.selects: Dict[str, List[Select]] = {
+            owner: [Select(owned, table, column, key, owner) for owned, table, column, key in edges]
+            for owner, edges in self.edges.items()}
+        self.unlinks: Dict[str, List[Unlink]] = {
+            each: [Unlink(relation_types[other], f'{each.lower()}_id', each) for other in sorted(relation_types)]
+            for each, relation_types in dbp.LRType.items()}
+        self.nullifies: Dict[str, List[Nullify]] = defaultdict(list)
+        for holder, targets in sorted(dbp.ForeignKeys.items()):
+            for target, column in targets.items():
+                self.nullifies[target].append(Nullify(holder, column, target))
+        self.orders: Dict[str, List[str]] = {}
+        self.steps: Dict[str, List[OrmStep]] = {}
+
+
+def ownership_order(graph: OwnershipGraph, root: str) -> List[str]:
+    """
+    root 及其(间接)拥有的表, 拥有者在前。所有权成环时抛出 OwnershipCycle。
+    """
+    if root in graph.orders:
+        return graph.orders[root]
+    done = set()
+    path: List[str] = []
+    post_order = []
+
+    def visit(table: str):
+        if table in path:
+            raise OwnershipCycle(path[path.index(table):] + [table])
+        if table in done:
+            return
+        path.append(table)
+        for owned, *_ in graph.edges.get(table, ()):
+            visit(owned)
+        path.pop()
+        done.add(table)
+        post_order.append(table)
+
+    visit(root)
+    graph.orders[root] = post_order[::-1]
+    return graph.orders[root]
+
+
+def make_delete_plan(graph: OwnershipGraph, root: str, cascade: Optional[bool] = None) -> DeletePlan:
+    """
+    cascade: 是否依赖外键的 `ondelete`, 默认为 dbp.db_cascade。
+    """
+    dbp = graph.dbp
+    order = ownership_order(graph, root)
+    selects = [each for owner in order for each in graph.selects.get(owner, ())]
+    if not (dbp.db_cascade if cascade is None else cascade):
+        unlinks = [each for table in order for each in graph.unlinks.get(table, ())]
+        nullifies = [each for table in order for each in graph.nullifies.get(table, ())]
+        return DeletePlan(root, order, selects, unlinks, nullifies, order)
+
+    # 数据库级联: 只经由 `ondelete='CASCADE'` 的外键被拥有的表无需 DELETE;
+    # 从后往前去掉结果不再被用到的 SELECT
+    explicit = {root} | {each.target for each in selects if each.table != each.target}
+    deletes = [each for each in order if each in explicit]
+    needed = set(deletes)
+    kept = []
+    for each in reversed(selects):
+        if each.target in needed:
+            kept.append(each)
+            needed.add(each.source)
+    return DeletePlan(root, order, kept[::-1], [], [], deletes)
+
+
+def table_steps(graph: OwnershipGraph, table: str) -> List[OrmStep]:
+    """
+    table 的每个待删除实例上的步骤, 与从哪个表开始删除无关。
+    """
+    if table in graph.steps:
+        return graph.steps[table]
+    dbp = graph.dbp
+    steps = []
+    owned = dbp.RelationSpecForDestruction.get(table, {})
+    for other, attribute in sorted(dbp.RefTable.get(table, {}).items()):
+        if other in dbp.LRType.get(table, {}):
+            if other in owned:
+                steps.append(OrmStep(table, 'own_through', attribute, other, owned[other]))
+            else:
+                steps.append(OrmStep(table, 'unlink', attribute))
+            continue
+        holds_key = other in dbp.ForeignKeys.get(table, {})
+        if other in owned:
+            steps.append(OrmStep(table, 'own_one' if holds_key else 'own', attribute, other))
+        if not holds_key:
+            steps.append(OrmStep(table, 'nullify', attribute, other, dbp.ForeignKeys[other][table]))
+    graph.steps[table] = steps
+    return steps
+
+
+def orm_steps(graph: OwnershipGraph, root: str) -> List[OrmStep]:
+    """
+    逐个实例删除 root 时的步骤, 拥有者在前, 执行到某表的步骤时该表所有待删除的实例都已找到。
+    外键全部置空、关联表的行全部删除后, 各表的实体可以以任意顺序删除。
+    """
+    return [step for table in ownership_order(graph, root) for step in table_steps(graph, table)]
+
+
+def entity_tables(dbp: DBP) -> List[str]:
+    """
+    除关联表以外的表。
+    """
+    relation_tables = {each for rights in dbp.LRType.values() for each in rights.values()}
+    return [each for each in dbp.tables if each not in relation_tables]
+
@@ -3,7 +3,7 @@ import re
 import re
 
 comments = re.compile("#[^\n]*")
-_token = re.compile('[a-zA-Z][a-zA-Z_]*|\^|\,|\:|\=|\-|\~|\?|\!|\(|\)|\{|\}|\~|\n|\d+|\.|\>|\<')
+_token = re.compile('[a-zA-Z][a-zA-Z_]*|\^|\,|\:|\=|\-|\~|\?|\!|\(|\)|\{|\}|\~|\n|\d+|\.|\>|\<|\@')
 
 
 def token(strings):
@@ -0,0 +1,100 @@
+"""
+生成文件首行的指纹: `# dbg-fingerprint: <sha256>`, 其值为首行之后全部内容的哈希。
+
+工具只需读取首行即可判断生成结果是否变化; 内容不变时 dbgc 不重写文件, 文件的 mtime 保持不变。
+"""
+import hashlib
+import os
+import stat
+from typing import Optional
+
+HEADER = '# dbg-fingerprint: '
+_placeholder = f'{HEADER}{"0" * 64}\n'.encode()
+buffer_size = 1 << 16
+
+
+def read_fingerprint(filename: str) -> Optional[str]:
+    if not os.path.exists(filename):
+        return None
+    with open(filename, encoding='utf8') as f:
+        line = f.readline()
+    if not line.startswith(HEADER):
+        return None
+    return line[len(HEADER):].strip()
+
+
+def file_mode(filename: str) -> int:
+    """
+    写入 filename 时应有的权限: 已有文件保持原权限, 否则与 `open(filename, 'w')` 相同, 即 0o666 & ~umask。
+    """
+    try:
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+class FingerprintWriter:
+    """
+    边生成边写入的输出文件。
+
+        with FingerprintWriter('out.py') as out:
+            out.write(...)
+
+    内容先写入同目录下的临时文件, 首行为占位符; 结束时回填指纹,
+    若与已有文件的指纹相同则丢弃临时文件, 否则替换已有文件。出错时已有文件保持不变。
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.changed = False
+        self._hash = hashlib.sha256()
+        self._buffer = []
+        self._buffered = 0
+        # 命中缓存时只需读取指纹, tempfile 在写入时才导入
+        import tempfile
+        fd, self._tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix='.tmp')
+        self._file = os.fdopen(fd, 'wb')
+        self._file.write(_placeholder)
+
+    def write(self, text: str) -> None:
+        # 片段通常很小, 攒够一定大小再编码、计算哈希并写入
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        data = ''.join(self._buffer).encode('utf8')
+        self._buffer.clear()
+        self._buffered = 0
+        self._hash.update(data)
+        self._file.write(data)
+
+    def close(self) -> None:
+        self.flush()
+        digest = self._hash.hexdigest()
+        if read_fingerprint(self.filename) == digest:
+            self.discard()
+            return
+        self._file.seek(0)
+        self._file.write(f'{HEADER}{digest}\n'.encode())
+        self._file.close()
+        # mkstemp 创建的文件权限为 0600, 改为已有文件的权限, 新文件则按 umask
+        os.chmod(self._tmp, file_mode(self.filename))
+        os.replace(self._tmp, self.filename)
+        self.changed = True
+
+    def discard(self) -> None:
+        self._file.close()
+        os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
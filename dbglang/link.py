@@ -0,0 +1,176 @@
+"""
+多文件 schema 的分别编译与链接。
+
+每个 .dbg 文件单独解析, 其中的表定义分析为一个 Fragment(只依赖该文件内容, 可缓存,
+未命中缓存的文件在进程池中并行编译); 链接时按 import 顺序合并各 Fragment 的表,
+再统一分析全部 relation, 跨文件的关系由此写入 `DBP.RefTable` / `DBP.LRType`。
+
+    import common          # 同目录下的 common.dbg
+    import shared.users    # 同目录下的 shared/users.dbg
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+from .cache import CompileCache
+from .parallel import process_count
+from .parse import parse
+from .profiling import null_profiler
+from .rdp import Ast
+from .table_info_gen import DBP
+
+
+class LinkError(Exception):
+    pass
+
+
+class Fragment:
+    """
+    单个文件的编译结果。
+    """
+
+    def __init__(self, imports: List[Tuple[str, ...]], tables: dict, field_spec: dict, relations: List[Ast]):
+        self.imports = imports
+        self.tables = tables
+        self.field_spec = field_spec
+        self.relations = relations
+
+
+def compile_fragment(filename: str, legacy: bool = False, profiler=null_profiler) -> Fragment:
+    handler = DBP()
+    imports = []
+    relations = []
+    stmts = parse(filename, legacy=legacy, profiler=profiler)
+    with profiler.phase('ast_for_stmts'):
+        for stmt in stmts:
+            if stmt == '\n':
+                continue
+            if stmt.name == 'Import':
+                imports.append(tuple(each[0] for each in stmt))
+            elif stmt.name == 'Relation':
+                relations.append(stmt)
+            else:
+                handler.ast_for_table_def(stmt)
+    return Fragment(imports, handler.tables, dict(handler.FieldSpec), relations)
+
+
+def resolve_import(filename: str, module: Tuple[str, ...]) -> str:
+    return os.path.join(os.path.dirname(filename), *module) + '.dbg'
+
+
+def load_fragments(entry: str, jobs: Optional[int] = None, cache: Optional[CompileCache] = None,
+                   legacy: bool = False, profiler=null_profiler) -> Dict[str, Fragment]:
+    """
+    从入口文件开始按 import 逐层加载。每一层中未命中缓存的文件多于一个时, 在进程池中并行编译。
+    jobs 见 `parallel.process_count`。统计各阶段耗时(profiler)时不读取缓存, 总在本进程中编译每个文件。
+    """
+    jobs = process_count(jobs)
+    fragments: Dict[str, Fragment] = {}
+    wave = [os.path.abspath(entry)]
+    pool = None
+    use_cached = cache is not None and profiler is null_profiler
+    try:
+        while wave:
+            todo = []
+            for filename in wave:
+                fragment = cache.load_fragment(filename, legacy) if use_cached else None
+                if fragment is None:
+                    todo.append(filename)
+                else:
+                    fragments[filename] = fragment
+
+            if len(todo) > 1 and jobs > 1 and profiler is null_profiler:
+                if pool is None:
+                    from concurrent.futures import ProcessPoolExecutor
+                    pool = ProcessPoolExecutor(jobs)
+                compiled = pool.map(compile_fragment, todo, [legacy] * len(todo))
+            else:
+                compiled = (compile_fragment(filename, legacy, profiler) for filename in todo)
+
+            for filename, fragment in zip(todo, compiled):
+                fragments[filename] = fragment
+                if cache:
+                    cache.store_fragment(filename, fragment, legacy)
+
+            next_wave = []
+            for filename in wave:
+                for module in fragments[filename].imports:
+                    dependency = resolve_import(filename, module)
+                    if dependency in fragments or dependency in next_wave:
+                        continue
+                    if not os.path.exists(dependency):
+                        raise LinkError(f'{filename}: cannot find imported file {dependency}')
+                    next_wave.append(dependency)
+            wave = next_wave
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return fragments
+
+
+def copy_table(table: dict) -> dict:
+    """
+    表定义的副本, 代替 deepcopy。链接与代码生成会增删列的属性、向 relation / args 追加,
+    而列属性的值都是字符串或布尔值, 复制到列属性这一层即可。
+    """
+    return {key: {name: dict(spec) for name, spec in value.items()} if isinstance(value, dict) else
+            list(value) if isinstance(value, list) else value
+            for key, value in table.items()}
+
+
+def link_order(entry: str, fragments: Dict[str, Fragment]) -> List[str]:
+    """
+    被 import 的文件排在前面, 允许循环 import。
+    """
+    order = []
+    visited = set()
+
+    def visit(filename):
+        if filename in visited:
+            return
+        visited.add(filename)
+        for module in fragments[filename].imports:
+            visit(resolve_import(filename, module))
+        order.append(filename)
+
+    visit(os.path.abspath(entry))
+    return order
+
+
+def link(entry: str, fragments: Dict[str, Fragment], profiler=null_profiler, lazy: Optional[str] = None,
+         fk_relations: bool = False, db_cascade: bool = False) -> DBP:
+    """
+    lazy, fk_relations, db_cascade: 关系的生成方式, 见 `DBP`。
+    """
+    handler = DBP(lazy, fk_relations, db_cascade)
+    defined_in = {}
+    order = link_order(entry, fragments)
+
+    for filename in order:
+        fragment = fragments[filename]
+        for table_name, table in fragment.tables.items():
+            if table_name in defined_in:
+                raise LinkError(f'table {table_name} is defined in both {defined_in[table_name]} and {filename}')
+            defined_in[table_name] = filename
+            # Fragment 可能来自内存中的缓存, 链接与代码生成都会修改表定义
+            handler.tables[table_name] = copy_table(table)
+            handler.FieldSpec[table_name] = fragment.field_spec[table_name].copy()
+
+    with profiler.phase('ast_for_stmts'):
+        for filename in order:
+            for relation in fragments[filename].relations:
+                for weighted_symbol in (relation[0], relation[3]):
+                    table_name = weighted_symbol[0][0]
+                    if table_name not in handler.tables:
+                        raise LinkError(f'{filename}: relation refers to undefined table {table_name}')
+                handler.ast_for_relation(relation)
+
+    return handler
+
+
+def build(entry: str, jobs: Optional[int] = None, cache: Optional[CompileCache] = None,
+          legacy: bool = False, profiler=null_profiler, lazy: Optional[str] = None,
+          fk_relations: bool = False, db_cascade: bool = False) -> Tuple[DBP, List[str]]:
+    """
+    返回链接后的 DBP 以及参与编译的全部文件。
+    """
+    fragments = load_fragments(entry, jobs, cache, legacy, profiler)
+    return link(entry, fragments, profiler, lazy, fk_relations, db_cascade), list(fragments)
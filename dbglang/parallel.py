@@ -0,0 +1,19 @@
+"""
+`--jobs` 的含义, 链接(`link.load_fragments`)与代码生成(`code_gen.Analyzer`)共用。
+"""
+import os
+from typing import Optional
+
+# 未给出 jobs 时, 表少于这个数量的 schema 串行生成代码: 进程池的启动开销大于渲染本身
+min_parallel_tables = 200
+
+
+def process_count(jobs: Optional[int]) -> int:
+    """
+    jobs 为进程数; None(默认, 即命令行未给出 `--jobs`)表示 CPU 核数, 1 表示在本进程中串行执行。
+    链接在一层 import 中有多个未命中缓存的文件时启动进程池; 代码生成在多于一个表时启动,
+    jobs 为 None 时则要求至少 min_parallel_tables 个表。并行与否输出都相同。
+    """
+    if jobs is None:
+        return os.cpu_count() or 1
+    return max(1, jobs)
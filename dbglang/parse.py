@@ -1,14 +1,32 @@
-from Ruikowa.ErrorFamily import handle_error
-from Ruikowa.ObjectRegex.MetaInfo import MetaInfo
-from Ruikowa.ObjectRegex.ASTDef import Ast
-from .dbp import Stmts, token
+from .scanner import scan
+from .rdp import Ast, parse as rd_parse
+from .profiling import null_profiler
 
 
-def parse(input_filename) -> Ast:
-    with open(input_filename, encoding='utf8') as f:
-        s = f.read()
+def legacy_parse(tokens, input_filename: str) -> Ast:
+    from Ruikowa.ErrorFamily import handle_error
+    from Ruikowa.ObjectRegex.MetaInfo import MetaInfo
+    from .dbp import Stmts
+
     parser = handle_error(Stmts)
-    tokens = token(s)
-    meta = MetaInfo()
+    meta = MetaInfo(fileName=input_filename)
     stmts = parser(tokens, meta=meta, partial=False)
     return stmts
+
+
+def parse(input_filename, legacy=False, profiler=null_profiler) -> Ast:
+    """
+    legacy=True 时使用 Ruikowa 生成的组合子解析器(dbp.py)。
+    """
+    with open(input_filename, encoding='utf8') as f:
+        s = f.read()
+    if legacy:
+        from .etoken import token
+        with profiler.phase('tokenize'):
+            tokens = token(s)
+        with profiler.phase('parse'):
+            return legacy_parse(tokens, input_filename)
+    with profiler.phase('tokenize'):
+        stream = scan(s)
+    with profiler.phase('parse'):
+        return rd_parse(stream, input_filename)
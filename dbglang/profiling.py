@@ -0,0 +1,86 @@
+"""
+编译各阶段的耗时与内存峰值统计。
+
+    profiler = Profiler()
+    compile('db.dbg', 'out.py', profiler=profiler)
+    print(profiler.report())
+
+同名阶段(例如多个文件的 tokenize)的耗时累加, 内存峰值取最大值。
+"""
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+PHASES = ('tokenize', 'parse', 'ast_for_stmts', 'generate_table', 'delete functions', 'test samples', 'write')
+
+
+# tracemalloc.reset_peak 需要 Python 3.9+
+can_reset_peak = hasattr(tracemalloc, 'reset_peak')
+
+
+def phase_peak(base: int, base_peak: int) -> int:
+    """
+    阶段开始时内存为 base、峰值为 base_peak, 求阶段内相对 base 的峰值。
+    不能重置峰值时, 若峰值在阶段内未被刷新, 只能以阶段结束时的内存增量近似。
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    if can_reset_peak or peak > base_peak:
+        return peak - base
+    return max(current - base, 0)
+
+
+class Profiler:
+
+    def __init__(self, trace_memory: bool = True, on_phase: Optional[Callable[[str, float, int], None]] = None):
+        """
+        on_phase: 每个阶段结束时以 (阶段名, 秒, 内存峰值字节数) 调用。
+        """
+        self.trace_memory = trace_memory
+        self.on_phase = on_phase
+        self._started_tracing = False
+        self.seconds: Dict[str, float] = OrderedDict((name, 0.0) for name in PHASES)
+        self.peak: Dict[str, int] = OrderedDict((name, 0) for name in PHASES)
+
+    @contextmanager
+    def phase(self, name: str):
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if can_reset_peak:
+                tracemalloc.reset_peak()
+            base, base_peak = tracemalloc.get_traced_memory()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            seconds = perf_counter() - start
+            peak = phase_peak(base, base_peak) if self.trace_memory else 0
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.peak[name] = max(self.peak.get(name, 0), peak)
+            if self.on_phase:
+                self.on_phase(name, seconds, peak)
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def report(self) -> str:
+        lines: List[str] = [f'{"phase":<20}{"seconds":>12}{"peak KiB":>12}']
+        for name, seconds in self.seconds.items():
+            lines.append(f'{name:<20}{seconds:>12.4f}{self.peak[name] / 1024:>12.1f}')
+        lines.append(f'{"total":<20}{sum(self.seconds.values()):>12.4f}')
+        return '\n'.join(lines)
+
+
+class NullProfiler:
+
+    @contextmanager
+    def phase(self, name: str):
+        yield
+
+
+null_profiler = NullProfiler()
@@ -0,0 +1,276 @@
+"""
+手写的递归下降解析器, 对应 `grammar` 中定义的语言。
+
+直接读取 `scanner.TokenStream`, 一次扫描, 不回溯, 输出与 Ruikowa 生成的 `dbp.Stmts` 相同形状的 AST,
+供 `DBP.ast_for_stmts` 直接使用。节点的 meta 为其首个 token 的下标, 可由 `TokenStream.location` 换算为行列。
+"""
+from array import array
+from .scanner import TokenStream, kind_of, EOF, SYMBOL, NEWLINE
+
+option_kinds = {kind_of[c] for c in ('?', '!', '~', '@')}
+index_keywords = ('index', 'unique')
+
+
+class DSLSyntaxError(SyntaxError):
+    pass
+
+
+class Ast(list):
+    """
+    与 `Ruikowa.ObjectRegex.ASTDef.Ast` 接口一致的语法树节点。
+    """
+    __slots__ = ('name', 'meta')
+
+    def __init__(self, meta, name):
+        self.name = name
+        self.meta = meta
+
+    def __str__(self):
+        return self.dump()
+
+    def dump(self, indent=0):
+        next_indent = '    ' * (indent + 1)
+        content = '\n'.join(f'{next_indent}"{node}"' if isinstance(node, str) else node.dump(indent + 1)
+                            for node in self)
+        return '{indent}{name}[\n{content}\n{indent}]'.format(indent='    ' * indent, name=self.name, content=content)
+
+
+class Parser:
+
+    def __init__(self, stream: TokenStream, filename: str = '<input>'):
+        self.stream = stream
+        # 末尾补两个 EOF, 向前看时无需检查越界
+        self.kinds = stream.kinds + array('B', (EOF, EOF))
+        self.filename = filename
+        self.pos = 0
+
+    def error(self, expected: str):
+        stream = self.stream
+        row, col = stream.location(self.pos)
+        info = ' '.join(stream.text(i) for i in range(self.pos, min(self.pos + 10, len(stream)))
+                        if stream.kinds[i] != NEWLINE)
+        if len(stream) > self.pos + 10:
+            info += '...'
+        raise DSLSyntaxError(f'\n'
+                             f'Syntax Error at {self.filename} row {row} column {col}\n'
+                             f'   Expected {expected}, error startswith :\n'
+                             f'{info}\n')
+
+    def kind(self, offset=0) -> int:
+        return self.kinds[self.pos + offset]
+
+    def at(self, char: str, offset=0) -> bool:
+        return self.kinds[self.pos + offset] == kind_of[char]
+
+    def at_keyword(self, keyword: str) -> bool:
+        return self.kinds[self.pos] == SYMBOL and self.stream.text(self.pos) == keyword
+
+    def next(self) -> str:
+        tok = self.stream.text(self.pos)
+        self.pos += 1
+        return tok
+
+    def expect(self, char: str) -> str:
+        if not self.at(char):
+            self.error(repr(char))
+        return self.next()
+
+    def expect_keyword(self, keyword: str) -> str:
+        if not self.at_keyword(keyword):
+            self.error(repr(keyword))
+        return self.next()
+
+    def skip_newlines(self):
+        kinds = self.kinds
+        pos = self.pos
+        while kinds[pos] == NEWLINE:
+            pos += 1
+        self.pos = pos
+
+    def node(self, name: str) -> Ast:
+        return Ast(self.pos, name)
+
+    def symbol(self) -> Ast:
+        pos = self.pos
+        if self.kinds[pos] != SYMBOL:
+            self.error('Symbol')
+        ret = Ast(pos, 'Symbol')
+        ret.append(self.stream.text(pos))
+        self.pos = pos + 1
+        return ret
+
+    def stmts(self) -> Ast:
+        ret = self.node('Stmts')
+        while True:
+            self.skip_newlines()
+            if self.kind() == EOF:
+                return ret
+            if self.kind() != SYMBOL:
+                self.error('Import, TableDef or Relation')
+            if self.kind(1) == SYMBOL and self.at_keyword('import'):
+                ret.append(self.import_def())
+            elif self.at('(', 1):
+                ret.append(self.table_def())
+            else:
+                ret.append(self.relation())
+
+    def import_def(self) -> Ast:
+        ret = self.node('Import')
+        self.expect_keyword('import')
+        ret.append(self.symbol())
+        while self.at('.'):
+            self.next()
+            ret.append(self.symbol())
+        return ret
+
+    def table_def(self) -> Ast:
+        ret = self.node('TableDef')
+        ret.append(self.symbol())
+        self.expect('(')
+        ret.append(self.primary_def_list())
+        self.expect(')')
+        self.skip_newlines()
+        self.expect('{')
+        self.skip_newlines()
+        ret.append(self.field_def_list())
+        while self.kind() == SYMBOL and self.at('{', 1) and self.stream.text(self.pos) in index_keywords:
+            ret.append(self.index_def())
+            self.skip_newlines()
+        if self.at_keyword('repr'):
+            ret.append(self.repr_def())
+            self.skip_newlines()
+        self.expect('}')
+        return ret
+
+    def primary_def_list(self) -> Ast:
+        ret = self.node('PrimaryDefList')
+        ret.append(self.field_def())
+        while self.at(','):
+            self.next()
+            ret.append(self.field_def())
+        return ret
+
+    def field_def_list(self) -> Ast:
+        ret = self.node('FieldDefList')
+        while self.kind() == SYMBOL and self.at(':', 1):
+            ret.append(self.field_def())
+            self.skip_newlines()
+        return ret
+
+    def field_def(self) -> Ast:
+        ret = self.node('FieldDef')
+        ret.append(self.symbol())
+        self.expect(':')
+        ret.append(self.type())
+        return ret
+
+    def type(self) -> Ast:
+        ret = self.node('Type')
+        ret.append(self.symbol())
+        while self.kind() in option_kinds:
+            option = self.node('Option')
+            option.append(self.next())
+            # `~hilo`, `~snowflake`: id 的分配方式
+            if option[0] == '~' and self.kind() == SYMBOL:
+                option.append(self.symbol())
+            ret.append(option)
+        if self.at('='):
+            self.next()
+            ret.append(self.default())
+        return ret
+
+    def default(self) -> Ast:
+        ret = self.node('Default')
+        while self.kind() not in (NEWLINE, EOF):
+            ret.append(self.next())
+        if not ret:
+            self.error('Default')
+        return ret
+
+    def repr_def(self) -> Ast:
+        ret = self.node('ReprDef')
+        self.expect_keyword('repr')
+        if self.at('='):
+            self.next()
+            self.expect_keyword('all')
+            return ret
+        self.expect('{')
+        self.skip_newlines()
+        ret.append(self.symbol_list())
+        self.skip_newlines()
+        self.expect('}')
+        return ret
+
+    def symbol_list(self) -> Ast:
+        ret = self.node('SymbolList')
+        ret.append(self.symbol())
+        while self.at(','):
+            self.next()
+            ret.append(self.symbol())
+        return ret
+
+    def index_def(self) -> Ast:
+        ret = self.node('IndexDef')
+        ret.append(self.next())
+        self.expect('{')
+        self.skip_newlines()
+        ret.append(self.symbol_list())
+        self.skip_newlines()
+        self.expect('}')
+        if self.at_keyword('include'):
+            include = self.node('IncludeDef')
+            self.next()
+            self.expect('{')
+            self.skip_newlines()
+            include.append(self.symbol_list())
+            self.skip_newlines()
+            self.expect('}')
+            ret.append(include)
+        if self.at_keyword('where'):
+            where = self.node('WhereDef')
+            self.next()
+            where.append(self.default())
+            ret.append(where)
+        return ret
+
+    def weighted_symbol(self) -> Ast:
+        ret = self.node('WeightedSymbol')
+        ret.append(self.symbol())
+        while self.at('^'):
+            ret.append(self.next())
+        return ret
+
+    def arrow(self, name: str, char: str) -> Ast:
+        ret = self.node(name)
+        ret.append(self.expect(char))
+        if self.at(char):
+            ret.append(self.next())
+        return ret
+
+    def relation(self) -> Ast:
+        ret = self.node('Relation')
+        ret.append(self.weighted_symbol())
+        ret.append(self.arrow('Left', '<'))
+        self.expect('-')
+        ret.append(self.arrow('Right', '>'))
+        ret.append(self.weighted_symbol())
+        self.skip_newlines()
+        self.expect('{')
+        self.skip_newlines()
+        ret.append(self.field_def_list())
+        if self.at_keyword('lazy'):
+            ret.append(self.lazy_def())
+            self.skip_newlines()
+        self.expect('}')
+        return ret
+
+    def lazy_def(self) -> Ast:
+        ret = self.node('LazyDef')
+        self.expect_keyword('lazy')
+        self.expect('=')
+        ret.append(self.symbol())
+        return ret
+
+
+def parse(stream: TokenStream, filename: str = '<input>') -> Ast:
+    return Parser(stream, filename).stmts()
@@ -0,0 +1,65 @@
+"""
+一次扫描的分词器。
+
+与 `etoken.token` 识别相同的 token, 但不复制源码也不丢弃位置:
+token 种类保存在 array('B') 中, 起止偏移保存在 array('I') 中,
+文本在需要时再从源码切片得到。
+"""
+import re
+from array import array
+from typing import Tuple
+
+EOF = 0
+SYMBOL = 1
+NUMBER = 2
+NEWLINE = 3
+
+PUNCTUATIONS = '^,:=-~?!(){}.><@'
+
+kind_of = {c: i + 4 for i, c in enumerate(PUNCTUATIONS)}
+kind_of['\n'] = NEWLINE
+
+# 与 etoken 一致: 不能识别的字符直接跳过
+_scanner = re.compile(r'(#[^\n]*)|([a-zA-Z][a-zA-Z_]*)|(\d+)|(\n)|([\^,:=\-~?!(){}.><@])')
+_group_kind = (None, None, SYMBOL, NUMBER, NEWLINE)
+
+
+class TokenStream:
+    __slots__ = ('source', 'kinds', 'starts', 'ends')
+
+    def __init__(self, source: str):
+        self.source = source
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def text(self, i: int) -> str:
+        return self.source[self.starts[i]:self.ends[i]]
+
+    def location(self, i: int) -> Tuple[int, int]:
+        """
+        第 i 个 token 的 (行, 列), 从 1 开始计数。超出末尾时返回源码结尾的位置。
+        """
+        offset = self.starts[i] if i < len(self.kinds) else len(self.source)
+        row = self.source.count('\n', 0, offset) + 1
+        col = offset - self.source.rfind('\n', 0, offset)
+        return row, col
+
+
+def scan(source: str) -> TokenStream:
+    stream = TokenStream(source)
+    add_kind = stream.kinds.append
+    add_start = stream.starts.append
+    add_end = stream.ends.append
+    for m in _scanner.finditer(source):
+        group = m.lastindex
+        if group == 1:
+            continue
+        start, end = m.span()
+        add_kind(kind_of[source[start]] if group == 5 else _group_kind[group])
+        add_start(start)
+        add_end(end)
+    return stream
@@ -1,28 +1,132 @@
 """
 从ast生成对应的tables列表
 """
+import re
+from functools import lru_cache
+from keyword import iskeyword
 from collections import defaultdict
-from typing import Dict, Set, List, Optional, Union, Tuple
-from Ruikowa.ObjectRegex.ASTDef import Ast
+from typing import Callable, Dict, Set, List, Optional, Union, Tuple
+from .rdp import Ast
 from .type_map import type_map
 
 Indent = '    '
 Indentn = '\n' + Indent
 
 
+@lru_cache(maxsize=None)
+def sql_table_name(table_name: str) -> str:
+    """
+    类名对应的 __tablename__, 例如 UserCourse => user_course。生成删除函数时每个表会用到多次, 结果缓存。
+    """
+    return '_'.join(map(str.lower, re.findall('[A-Z][a-z_]*', table_name)))
+
+
+def attribute_name(name: str) -> str:
+    """
+    生成的属性名, 与关键字相同时加后缀 `_`, 例如表 A 的 `as` => `as_`。
+    """
+    return f'{name}_' if iskeyword(name) else name
+
+
+def sql_condition(tokens: List[str]) -> str:
+    """
+    把 `where` 之后的 token 拼回 SQL 条件, 例如 ['cost', '>', '=', '0'] => 'cost >= 0'。
+    """
+    ret = []
+    for each in tokens:
+        if ret and (each == '.' or ret[-1].endswith('.') or ret[-1][-1] in '<>=!' and each in '<>=!'):
+            ret[-1] += each
+        else:
+            ret.append(each)
+    return ' '.join(ret)
+
+
 def repr_for(name, *fields):
     field_list = ', '.join([f'{field}:{{self.{field}}}' for field in fields])
     return 'f"{name}{{{{ {field_list} }}}}"'.format(name=name, field_list=field_list)
 
 
 def make_reference(ref_name: str, reference_type_name: str, from_field: str, ref_field: str, use_list=True):
-    output_type_name = f'{{}}[{reference_type_name}]'.format('Query' if use_list else 'Optional')
-    res = (f'\n{Indent}@property\n'
-           f'{Indent}def {ref_name}(self) -> "{output_type_name}":\n'
-           f'{Indent*2}return filter_from_table({reference_type_name}, {reference_type_name}.{ref_field} == self.{from_field})')
+    """
+    每次访问都查询的属性; 已由 `prefetch` 加载时使用加载结果(列表属性仍返回 Query, 见 `PrefetchedQuery`)。
+    """
+    query = f'filter_from_table({reference_type_name}, {reference_type_name}.{ref_field} == self.{from_field})'
+    if use_list:
+        return (f'\n{Indent}@property\n'
+                f'{Indent}def {ref_name}(self) -> "Query[{reference_type_name}]":\n'
+                f"{Indent*2}return with_prefetched(self, '{ref_name}', {query})\n")
+    return (f'\n{Indent}@property\n'
+            f'{Indent}def {ref_name}(self) -> "Optional[{reference_type_name}]":\n'
+            f"{Indent*2}ret = prefetched(self, '{ref_name}')\n"
+            f'{Indent*2}if ret is NotPrefetched:\n'
+            f'{Indent*3}ret = {query}.first()\n'
+            f'{Indent*2}return ret\n')
+
+
+def make_through_reference(ref_name: str, reference_type_name: str, relation_type_name: str, owner_field: str,
+                           ref_field: str):
+    """
+    经由关联表直接得到关系另一端的实体, 一次 JOIN。
+    """
+    return (f'\n{Indent}@property\n'
+            f'{Indent}def {ref_name}(self) -> "Query[{reference_type_name}]":\n'
+            f"{Indent*2}return with_prefetched(self, '{ref_name}', {reference_type_name}.query.join("
+            f'{relation_type_name}, {relation_type_name}.{ref_field} == {reference_type_name}.id).filter('
+            f'{relation_type_name}.{owner_field} == self.id))\n')
+
+
+def make_through_with_fields(ref_name: str, reference_type_name: str, relation_type_name: str, owner_field: str,
+                             ref_field: str, fields: List[str]):
+    """
+    同 `make_through_reference`, 每一行另外带上关联表中的字段: `(实体, 字段1, 字段2, ...)`。
+    """
+    columns = ', '.join([reference_type_name, *(f'{relation_type_name}.{field}' for field in fields)])
+    return (f'\n{Indent}@property\n'
+            f'{Indent}def {ref_name}(self) -> "Query[Tuple[{reference_type_name}, ...]]":\n'
+            f'{Indent*2}return db_session.query({columns}).join('
+            f'{relation_type_name}, {relation_type_name}.{ref_field} == {reference_type_name}.id).filter('
+            f'{relation_type_name}.{owner_field} == self.id)\n')
+
+
+# relationship() 可用的加载方式, 见 `DBP.lazy` 与关系定义中的 `lazy = ...`
+LOADING_STRATEGIES = ('select', 'selectin', 'joined', 'subquery', 'raise')
+
+# `~<strategy>` 可用的 id 分配方式, 不写时为 Sequence; 见 templates.py 的 HiLo 与 Snowflake
+ID_STRATEGIES = ('hilo', 'snowflake')
+
+
+class SchemaError(Exception):
+    pass
+
+
+def make_through_relationship(ref_name: str, owner_type_name: str, reference_type_name: str, relation_type_name: str,
+                              owner_field: str, ref_field: str, lazy: str):
+    """
+    `make_through_reference` 的 relationship() 版本, 以关联表为 secondary。
+    """
+    return (f'\n{Indent}{ref_name} = relationship("{reference_type_name}", '
+            f'secondary=lambda: {relation_type_name}.__table__, '
+            f'primaryjoin="{owner_type_name}.id == foreign({relation_type_name}.{owner_field})", '
+            f'secondaryjoin="{reference_type_name}.id == foreign({relation_type_name}.{ref_field})", '
+            f'lazy="{lazy}", viewonly=True)\n')
+
 
-    res += '\n' if use_list else '.first()\n'
-    return res
+def make_relationship(ref_name: str, owner_type_name: str, reference_type_name: str, from_field: str, ref_field: str,
+                      lazy: str, use_list=True):
+    """
+    与 `make_reference` 对应的 relationship() 版本, 加载方式由 lazy 指定。
+    关系存为关联表时, 关联表的 `<table>_id` 列带有指向两端的外键; `--fk-relations` 下存为外键列时,
+    持有方的 `<target>_id` 列带有外键。两种情况都用 foreign() 显式标出持有外键的一侧, 连接方向不依赖外键推断。
+    关系只读, 写入仍通过关联表的行或外键列进行。
+    """
+    owner_column = f'{owner_type_name}.{from_field}'
+    ref_column = f'{reference_type_name}.{ref_field}'
+    if use_list:
+        ref_column = f'foreign({ref_column})'
+    else:
+        owner_column = f'foreign({owner_column})'
+    return (f'\n{Indent}{ref_name} = relationship("{reference_type_name}", '
+            f'primaryjoin="{owner_column} == {ref_column}", uselist={use_list}, lazy="{lazy}", viewonly=True)\n')
 
 
 class DBP:
@@ -30,7 +134,19 @@ class DBP:
     解析一个dbp文件
     """
 
-    def __init__(self):
+    def __init__(self, lazy: Optional[str] = None, fk_relations: bool = False, db_cascade: bool = False):
+        """
+        lazy: 关系的默认加载方式(`LOADING_STRATEGIES` 之一)。
+              为 None 时, 未写 `lazy = ...` 的关系生成每次访问都查询的属性。
+        fk_relations: 为 True 时, 不带字段的一对一与一对多关系存为外键列而不是关联表。
+        db_cascade: 为 True 时外键带 `ondelete`: 关联表的行随两端删除;
+                    外键列在持有者被引用的一方拥有时随之删除, 否则置空。
+        """
+        self.fk_relations = fk_relations
+        self.db_cascade = db_cascade
+        if lazy is not None and lazy not in LOADING_STRATEGIES:
+            raise SchemaError(f'unknown loading strategy {lazy!r}, expected one of {", ".join(LOADING_STRATEGIES)}')
+        self.lazy = lazy
         self.tables = {}
         # 所有表定义的spec
         # 结构为 {
@@ -46,6 +162,7 @@ class DBP:
         #                   ...
         #                 }
         #    'repr': <__repr__返回的表达式>
+        #    'args': [<__table_args__中的 Index/UniqueConstraint 表达式>, ...]
         # }
 
         self.FieldSpec: Dict[str, Set[str]] = defaultdict(set)
@@ -64,6 +181,10 @@ class DBP:
         self.LRType: Dict[str, Dict[str, str]] = defaultdict(dict)
         # 根据左右表名，得到中间表名
 
+        self.ForeignKeys: Dict[str, Dict[str, str]] = defaultdict(dict)
+        # 外键模式下存为外键列的关系, 根据持有外键的表与被引用的表得到外键列名
+        # 例如 ForeignKeys[User][Some] = 'some_id'
+
         self.LRRef: Dict[str, Dict[str, str]] = self.RefTable
         # 根据左右表名，得到从左查右的关系名
 
@@ -79,6 +200,9 @@ class DBP:
     def ast_for_stmt(self, stmt: Ast) -> None:
         if stmt.name == 'Relation':
             self.ast_for_relation(stmt)
+        elif stmt.name == 'Import':
+            # 由 link 模块处理
+            return
         else:
             self.ast_for_table_def(stmt)
 
@@ -105,7 +229,11 @@ class DBP:
         for each in tuple(primaries.keys()):
             primaries[each]['primary_key'] = True
 
-        fields, repr = self.ast_for_field_def_list(*tail)
+        field_def_list, *tail = tail
+        index_defs = [each for each in tail if each.name == 'IndexDef']
+        repr_defs = [each for each in tail if each.name == 'ReprDef']
+
+        fields, repr = self.ast_for_field_def_list(field_def_list, *repr_defs)
 
         if not repr:
             repr = repr_for(table_name, *primaries.keys(), *fields.keys())
@@ -115,7 +243,44 @@ class DBP:
             'primary': primaries,
             'field': fields,
             'repr': repr,
-            'relation': []}
+            'relation': [],
+            'args': [self.ast_for_index_def(each) for each in index_defs]}
+
+    def ast_for_index_def(self, index_def: Ast) -> str:
+        """
+        `index{a, b}` => Index, `unique{a, b}` => UniqueConstraint;
+        带 `include{...}`(覆盖索引) 或 `where ...`(部分索引) 时都生成 Index。
+        """
+        table_name = self.current_table_name
+        kind, symbol_list, *options = index_def
+        columns = [each[0] for each in symbol_list]
+        include = []
+        where = None
+        for option in options:
+            if option.name == 'IncludeDef':
+                include = [each[0] for each in option[0]]
+            else:
+                where = sql_condition(option[0])
+
+        for each in columns + include:
+            if each not in self.FieldSpec[table_name]:
+                raise SchemaError(f'{table_name}: {kind}{{{", ".join(columns)}}} refers to an undefined field {each!r}')
+
+        unique = kind == 'unique'
+        name = f"{'uq' if unique else 'ix'}_{sql_table_name(table_name)}_{'_'.join(columns)}"
+        args = ', '.join(f"'{each}'" for each in columns)
+        if unique and not include and where is None:
+            return f"UniqueConstraint({args}, name='{name}')"
+
+        ret = [f"'{name}'", args]
+        if unique:
+            ret.append('unique=True')
+        if include:
+            ret.append(f'postgresql_include={include!r}')
+        if where is not None:
+            ret.append(f'postgresql_where=text({where!r})')
+            ret.append(f'sqlite_where=text({where!r})')
+        return f"Index({', '.join(ret)})"
 
     def ast_for_field_def(self, field_def: Ast) -> Tuple[str, dict]:
         (field_name,), type = field_def
@@ -133,6 +298,7 @@ class DBP:
             type_name = type_map(type_name[0])
             ret = {'__type__': type_name, 'default': ''.join(default)}
 
+        strategies = [o[1][0] for o in options if len(o) > 1]
         options = ''.join([o[0] for o in options])
 
         if '!' in options:
@@ -141,13 +307,77 @@ class DBP:
         if '?' not in options:
             ret['nullable'] = False
 
-        if '~' in options:
+        if '@' in options:
+            ret['index'] = True
+
+        if strategies:
+            strategy = strategies[0]
+            if len(strategies) > 1 or strategy not in ID_STRATEGIES:
+                raise SchemaError(f'{table_name}: unknown id strategy {"~".join(strategies)!r}, '
+                                  f'expected one of {", ".join(ID_STRATEGIES)}')
+            if 'default' in ret:
+                raise SchemaError(f'{table_name}: ~{strategy} cannot be combined with a default value')
+            # 在客户端分配 id, 插入前即可得到; snowflake 的 id 超过 32 位
+            if strategy == 'snowflake':
+                ret['__type__'] = 'BigInteger'
+            ret['default'] = f"{'HiLo' if strategy == 'hilo' else 'Snowflake'}('{sql_table_name(table_name)}')"
+        elif '~' in options:
             ret['__sequence__'] = f"Sequence('{table_name.lower()}_id_seq')"
 
         return ret
 
+    def id_type(self, table_name: str) -> str:
+        """
+        指向 table_name 的外键列的类型, 与其 id 相同。
+        """
+        return self.tables[table_name]['primary'].get('id', {}).get('__type__', 'Integer')
+
+    def ast_for_lazy(self, lazy_def: Ast, relation_table_name: str) -> str:
+        (lazy,), = lazy_def
+        if lazy not in LOADING_STRATEGIES:
+            raise SchemaError(f'{relation_table_name}: unknown loading strategy {lazy!r}, '
+                              f'expected one of {", ".join(LOADING_STRATEGIES)}')
+        return lazy
+
+    def foreign_key(self, target: str, ondelete: str) -> str:
+        if self.db_cascade:
+            return f"ForeignKey('{sql_table_name(target)}.id', ondelete='{ondelete}')"
+        return f"ForeignKey('{sql_table_name(target)}.id')"
+
+    def ast_for_foreign_key(self, holder: str, target: str, unique: bool, reference: Callable[..., str]) -> None:
+        """
+        在 holder 表中加入指向 target 的外键列 `<target>_id`(带索引, 一对一时唯一)。
+        holder 一侧生成 `<target>` 属性, target 一侧生成 `<holder>s` 属性。
+        """
+        holder_name = holder.lower()
+        target_name = target.lower()
+        column = f'{target_name}_id'
+        holder_table = self.tables[holder]
+        if column in holder_table['primary'] or column in holder_table['field']:
+            raise SchemaError(f'{holder}.{column} is already defined, '
+                              f'cannot store the relation to {target} as a foreign key')
+
+        ondelete = 'CASCADE' if holder in self.RelationSpecForDestruction.get(target, ()) else 'SET NULL'
+        spec = {'__type__': self.id_type(target), '__foreign__': self.foreign_key(target, ondelete), 'index': True}
+        if unique:
+            spec['unique'] = True
+        holder_table['field'][column] = spec
+        self.FieldSpec[holder].add(column)
+        self.ForeignKeys[holder][target] = column
+
+        self.RelationSpec[holder].add(target_name)
+        self.RelationSpec[target].add(holder_name)
+        self.RefTable[holder][target] = attribute_name(target_name)
+        self.RefTable[target][holder] = attribute_name(f'{holder_name}s')
+
+        holder_table['relation'].append(
+            reference(self.RefTable[holder][target], holder, target, column, 'id', use_list=False))
+        self.tables[target]['relation'].append(
+            reference(self.RefTable[target][holder], target, holder, 'id', column, use_list=True))
+
     def ast_for_relation(self, relation_def: Ast) -> None:
-        left_weighted_symbol, left_ref_level, right_ref_level, right_weighted_symbol, field_def_list = relation_def
+        (left_weighted_symbol, left_ref_level, right_ref_level, right_weighted_symbol, field_def_list,
+         *lazy_def) = relation_def
 
         (upper_case_left_name,), *l_weights = left_weighted_symbol
         (upper_case_right_name,), *r_weights = right_weighted_symbol
@@ -165,21 +395,56 @@ class DBP:
 
         fields, _ = self.ast_for_field_def_list(field_def_list)
 
+        upper_case_table_name = f'{upper_case_left_name}{upper_case_right_name}'
+
+        lazy = self.ast_for_lazy(lazy_def[0], upper_case_table_name) if lazy_def else self.lazy
+        if lazy is None:
+            def reference(ref_name, owner_type_name, reference_type_name, from_field, ref_field, use_list):
+                return make_reference(ref_name, reference_type_name, from_field, ref_field, use_list=use_list)
+
+            def through(ref_name, owner_type_name, reference_type_name, owner_field, ref_field):
+                return make_through_reference(ref_name, reference_type_name, upper_case_table_name, owner_field,
+                                              ref_field)
+        else:
+            def reference(ref_name, owner_type_name, reference_type_name, from_field, ref_field, use_list):
+                return make_relationship(ref_name, owner_type_name, reference_type_name, from_field, ref_field,
+                                         lazy, use_list=use_list)
+
+            def through(ref_name, owner_type_name, reference_type_name, owner_field, ref_field):
+                return make_through_relationship(ref_name, owner_type_name, reference_type_name,
+                                                 upper_case_table_name, owner_field, ref_field, lazy)
+
+        if self.fk_relations and not fields and (left_ref_level, right_ref_level) != (2, 2):
+            """存为外键列: 一对多时由多的一侧持有外键; 一对一时由被拥有的一侧持有, 无所有权时为右侧。
+            """
+            if left_ref_level != right_ref_level:
+                holder_is_left = left_ref_level == 2
+            else:
+                holder_is_left = r_weights > l_weights
+            holder, target = ((upper_case_left_name, upper_case_right_name) if holder_is_left else
+                              (upper_case_right_name, upper_case_left_name))
+            self.ast_for_ownership(upper_case_left_name, upper_case_right_name, l_weights, r_weights)
+            self.ast_for_foreign_key(holder, target, left_ref_level == right_ref_level, reference)
+            return
+
+        # 联合主键 (left_id, right_id) 可以按 left_id 查找; 另为 right_id 建索引, 供从右查左时使用
         primaries = {lower_case_left_name + '_id':
                          dict(primary_key=True,
-                              __type__='Integer'),
+                              __type__=self.id_type(upper_case_left_name),
+                              __foreign__=self.foreign_key(upper_case_left_name, 'CASCADE')),
                      lower_case_right_name + '_id':
                          dict(primary_key=True,
-                              __type__='Integer')}
-
-        upper_case_table_name = f'{upper_case_left_name}{upper_case_right_name}'
+                              __type__=self.id_type(upper_case_right_name),
+                              __foreign__=self.foreign_key(upper_case_right_name, 'CASCADE'),
+                              index=True)}
 
         repr = repr_for(upper_case_table_name, *primaries.keys(), *fields.keys())
 
         self.tables[upper_case_table_name] = {'primary': primaries,
                                               'field': fields,
                                               'repr': repr,
-                                              'relation': []}
+                                              'relation': [],
+                                              'args': []}
 
         """
         单数依然用-s结尾，表示列表。
@@ -201,19 +466,35 @@ class DBP:
         self.RefTable[upper_case_right_name][upper_case_left_name] = name_to_ref_left
 
         self.tables[upper_case_table_name]['relation'].extend([
-            make_reference(lower_case_left_name, upper_case_left_name, f'{lower_case_left_name}_id', 'id',
-                           use_list=False),
-            make_reference(lower_case_right_name, upper_case_right_name, f'{lower_case_right_name}_id', 'id',
-                           use_list=False)])
+            reference(attribute_name(lower_case_left_name), upper_case_table_name, upper_case_left_name,
+                      f'{lower_case_left_name}_id', 'id', use_list=False),
+            reference(attribute_name(lower_case_right_name), upper_case_table_name, upper_case_right_name,
+                      f'{lower_case_right_name}_id', 'id', use_list=False)])
 
         self.tables[upper_case_right_name]['relation'].append(
-            make_reference(name_to_ref_left, upper_case_table_name, 'id', f'{lower_case_right_name}_id',
-                           use_list=True))
+            reference(name_to_ref_left, upper_case_right_name, upper_case_table_name, 'id',
+                      f'{lower_case_right_name}_id', use_list=True))
 
         self.tables[upper_case_left_name]['relation'].append(
-            make_reference(name_to_ref_right, upper_case_table_name, 'id', f'{lower_case_left_name}_id',
-                           use_list=True))
-
+            reference(name_to_ref_right, upper_case_left_name, upper_case_table_name, 'id',
+                      f'{lower_case_left_name}_id', use_list=True))
+
+        # 不经过关联表实例, 直接得到另一端的实体, 例如 user.courses
+        for owner, owner_name, other, other_name in ((upper_case_left_name, lower_case_left_name,
+                                                      upper_case_right_name, lower_case_right_name),
+                                                     (upper_case_right_name, lower_case_right_name,
+                                                      upper_case_left_name, lower_case_left_name)):
+            relations = self.tables[owner]['relation']
+            relations.append(through(attribute_name(f'{other_name}s'), owner, other, f'{owner_name}_id',
+                                     f'{other_name}_id'))
+            if fields:
+                relations.append(make_through_with_fields(f'{other_name}s_with_fields', other, upper_case_table_name,
+                                                          f'{owner_name}_id', f'{other_name}_id', list(fields)))
+
+        self.ast_for_ownership(upper_case_left_name, upper_case_right_name, l_weights, r_weights)
+
+    def ast_for_ownership(self, upper_case_left_name: str, upper_case_right_name: str, l_weights: int,
+                          r_weights: int) -> None:
         if l_weights is 0 and r_weights is 0:
             """互相之间无所有权关系
             """
@@ -222,7 +503,9 @@ class DBP:
         if l_weights >= r_weights:
             """所有权归左
             """
-            self.RelationSpecForDestruction[upper_case_left_name][upper_case_right_name] = lower_case_right_name
+            self.RelationSpecForDestruction[upper_case_left_name][upper_case_right_name] = attribute_name(
+                upper_case_right_name.lower())
 
         if l_weights <= r_weights:
-            self.RelationSpecForDestruction[upper_case_right_name][upper_case_left_name] = lower_case_left_name
+            self.RelationSpecForDestruction[upper_case_right_name][upper_case_left_name] = attribute_name(
+                upper_case_left_name.lower())
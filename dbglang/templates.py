@@ -1,13 +1,26 @@
 from sqlalchemy import (create_engine, Integer, String,
                         DateTime, ForeignKey, Sequence,
-                        SmallInteger, Enum, Date, Table)
-from sqlalchemy import Column as _Column
-from sqlalchemy.orm import scoped_session, sessionmaker, Session as _Session
+                        SmallInteger, Enum, Date, Table,
+                        Index, UniqueConstraint, text,
+                        BigInteger, or_, func, bindparam)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import Column as _Column, event
+from sqlalchemy.orm import scoped_session, sessionmaker, relationship, foreign, Session as _Session, Query as _Query
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.ext.declarative import declarative_base
 from typing import Dict, Set, Any, List, Callable, Tuple, Type, Optional, Generic, TypeVar, Sequence as Seq, Union, \
-    Generator
+    Generator, Iterable, Collection, NamedTuple
 from abc import abstractmethod
+from keyword import iskeyword
 from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+import weakref
 
 T = TypeVar('T')
 
@@ -273,10 +286,145 @@ def filter_from_table(table, cond):
     return getattr(table, 'query').filter(cond)
 
 
+class NotPrefetched:
+    pass
+
+
+def prefetched(entity, name: str):
+    """
+    `prefetch` 挂到实例上的结果, 没有时返回 NotPrefetched。实例过期(包括提交)时丢弃, 见 `forget_prefetched`。
+    """
+    return entity.__dict__.get('_prefetched', {}).get(name, NotPrefetched)
+
+
+class PrefetchedQuery(_Query):
+    """
+    `prefetch` 加载过的列表属性返回的 Query: 直接迭代(或 all, first, count)时使用加载结果,
+    再加条件(filter, order_by 等)得到的新 Query 照常查询数据库。
+    """
+
+    @classmethod
+    def of(cls, query: _Query, rows: list) -> 'PrefetchedQuery':
+        ret = cls.__new__(cls)
+        ret.__dict__.update(query.__dict__)
+        # 生成式方法复制 __dict__ 得到新的 Query, 只有 ret 本身使用加载结果
+        ret._prefetched_rows = (weakref.ref(ret), rows)
+        return ret
+
+    def _loaded(self) -> Optional[list]:
+        owner, rows = self._prefetched_rows
+        return rows if owner() is self else None
+
+    def __iter__(self):
+        rows = self._loaded()
+        return super().__iter__() if rows is None else iter(rows)
+
+    def all(self):
+        rows = self._loaded()
+        return super().all() if rows is None else list(rows)
+
+    def first(self):
+        rows = self._loaded()
+        if rows is None:
+            return super().first()
+        return rows[0] if rows else None
+
+    def count(self):
+        rows = self._loaded()
+        return super().count() if rows is None else len(rows)
+
+
+def with_prefetched(entity, name: str, query: _Query) -> _Query:
+    """
+    默认方式生成的列表属性使用: `prefetch` 加载过时返回带加载结果的 PrefetchedQuery, 否则返回 query。
+    """
+    rows = prefetched(entity, name)
+    return query if rows is NotPrefetched else PrefetchedQuery.of(query, rows)
+
+
+RelationSpecEntry = Tuple[type, str, str, bool, Optional[Tuple[type, str]]]
+_relation_specs: Optional[Dict[Tuple[type, str], RelationSpecEntry]] = None
+
+
+def relation_specs() -> Dict[Tuple[type, str], RelationSpecEntry]:
+    """
+    由 RefTable, LRType 与 ForeignKeys 得到 (类, 关系名) => (目标类, 本端列, 目标列, 是否为列表, 经由的关联表)。
+    经由关联表时, 目标列是关联表中指向本端的列, 最后一项为 (关联表, 关联表中指向目标类的列)。
+    """
+    global _relation_specs
+    if _relation_specs is None:
+        specs = {}
+        for left, rights in LRType.items():
+            left_name = left.__name__.lower()
+            for right, relation_type in rights.items():
+                right_name = right.__name__.lower()
+                specs[left, RefTable[left][right]] = (relation_type, 'id', f'{left_name}_id', True, None)
+                # 与关键字相同的属性名带后缀 `_`, 例如 `as_`
+                specs[relation_type, f'{left_name}_' if iskeyword(left_name) else left_name] = (
+                    left, f'{left_name}_id', 'id', False, None)
+                through_name = f'{right_name}s_' if iskeyword(f'{right_name}s') else f'{right_name}s'
+                specs[left, through_name] = (right, 'id', f'{left_name}_id', True,
+                                             (relation_type, f'{right_name}_id'))
+        for holder, targets in ForeignKeys.items():
+            for target, column in targets.items():
+                specs[holder, RefTable[holder][target]] = (target, column, 'id', False, None)
+                specs[target, RefTable[target][holder]] = (holder, 'id', column, True, None)
+        _relation_specs = specs
+    return _relation_specs
+
+
+def prefetch(entities: Seq[T], *paths: str, chunk_size: int = 500) -> Seq[T]:
+    """
+    批量加载关系, 例如 prefetch(users, 'ref_courses.course', 'ref_groups')。
+    路径中的每一跳执行一次 `IN (...)` 查询(超过 chunk_size 个键时分批), 结果挂到实例上,
+    之后访问这些关系不再查询数据库。
+    """
+    specs = relation_specs()
+    for path in paths:
+        level = [each for each in entities if each is not None]
+        for name in path.split('.'):
+            by_type = defaultdict(list)
+            for each in level:
+                by_type[type(each)].append(each)
+            level = []
+            for entity_type, group in by_type.items():
+                spec = specs.get((entity_type, name))
+                if spec is None:
+                    raise AttributeError(f'{entity_type.__name__} has no relation {name!r}')
+                target, local, remote, use_list, through = spec
+                keys = list({getattr(each, local) for each in group})
+                found = defaultdict(list)
+                for i in range(0, len(keys), chunk_size):
+                    if through is None:
+                        for each in target.query.filter(getattr(target, remote).in_(keys[i:i + chunk_size])):
+                            found[getattr(each, remote)].append(each)
+                    else:
+                        relation_type, target_field = through
+                        key_column = getattr(relation_type, remote)
+                        query = db_session.query(target, key_column).join(
+                            relation_type, getattr(relation_type, target_field) == target.id).filter(
+                            key_column.in_(keys[i:i + chunk_size]))
+                        for each, key in query:
+                            found[key].append(each)
+
+                is_relationship = name in entity_type.__mapper__.relationships
+                for each in group:
+                    loaded = found.get(getattr(each, local), [])
+                    value = loaded if use_list else (loaded[0] if loaded else None)
+                    if is_relationship:
+                        set_committed_value(each, name, value)
+                    else:
+                        each.__dict__.setdefault('_prefetched', {})[name] = value
+                    level.extend(loaded)
+    return entities
+
+
 engine = create_engine(Config.database_url,
                        convert_unicode=True,
                        **Config.database_connect_options)
 
+##{engine_events}##
+
 db_session: Session = scoped_session(
     sessionmaker(autocommit=False,
                  autoflush=False,
@@ -286,6 +434,15 @@ Base = declarative_base()
 Base.query = db_session.query_property()
 
 
+@event.listens_for(Base, 'expire', propagate=True, raw=True)
+def forget_prefetched(state, attrs):
+    """
+    实例过期时(commit, expire, refresh)丢弃 `prefetch` 的结果, 与 relationship() 的已加载值一同失效。
+    state.dict 即实例的 __dict__, 实例已被回收时为空字典。
+    """
+    state.dict.pop('_prefetched', None)
+
+
 class FuncForRelations:
 
     @abstractmethod
@@ -303,6 +460,8 @@ class FuncForEntity:
 class DeleteManager:
     pre_relation_delete_events: Dict[Type[Table], Dict[Type[Table], FuncForRelations]] = defaultdict(dict)
     pre_entity_delete_events: Dict[Type[Table], FuncForEntity] = {}
+    bulk_delete_events: Dict[Type[Table], Callable[[Iterable[int]], Dict[str, int]]] = {}
+    chunked_delete_events: Dict[Type[Table], Callable[..., Dict[str, int]]] = {}
 
     @classmethod
     def get_relation_delete_fn(cls, from_type: type, delete_type: type) -> FuncForRelations:
@@ -312,6 +471,14 @@ class DeleteManager:
     def get_entity_delete_fn(cls, entity_type: type) -> FuncForEntity:
         return cls.pre_entity_delete_events[entity_type]
 
+    @classmethod
+    def get_bulk_delete_fn(cls, entity_type: type) -> Callable[[Iterable[int]], Dict[str, int]]:
+        return cls.bulk_delete_events[entity_type]
+
+    @classmethod
+    def get_chunked_delete_fn(cls, entity_type: type) -> Callable[..., Dict[str, int]]:
+        return cls.chunked_delete_events[entity_type]
+
     @staticmethod
     def Between(manage_type, delete_type: str):
         def wrap_fn(func):
@@ -328,11 +495,240 @@ class DeleteManager:
 
         return wrap
 
+    @classmethod
+    def Bulk(cls, entity_type):
+        def wrap(func):
+            cls.bulk_delete_events[entity_type] = func
+            return func
+
+        return wrap
+
+    @classmethod
+    def Chunked(cls, entity_type):
+        def wrap(func):
+            cls.chunked_delete_events[entity_type] = func
+            return func
+
+        return wrap
+
 def normal_delete_relations(*relations):
     for each in relations:
         db_session.delete(each)
 
 
+class DeleteStep(NamedTuple):
+    # 见 dbglang/delete_plan.py 的 OrmStep
+    table: type
+    action: str
+    attribute: str
+    target: Optional[type] = None
+    field: Optional[str] = None
+
+
+def run_delete_plan(entity_type: type, entities: Iterable) -> Dict[str, int]:
+    """
+    按编译时得到的 DeletePlans[entity_type] 删除 entities 及其(间接)拥有的对象, 不递归。
+    先删除关联表的行、置空指向被删除实例的外键并 flush, 再删除各表的实例。返回各表删除的实例数。
+    """
+    # 以 dict 作有序集合, 同一实例只处理一次
+    pending: Dict[type, Dict[Any, None]] = defaultdict(dict)
+    pending[entity_type].update(dict.fromkeys(entities))
+    links: Dict[Any, None] = {}
+    for step in DeletePlans[entity_type]:
+        for entity in pending[step.table]:
+            related = getattr(entity, step.attribute)
+            if step.action == 'own_one':
+                if related is not None:
+                    pending[step.target][related] = None
+                continue
+            for each in related:
+                if step.action == 'unlink':
+                    links[each] = None
+                elif step.action == 'own_through':
+                    links[each] = None
+                    owned = getattr(each, step.field)
+                    if owned is not None:
+                        pending[step.target][owned] = None
+                elif step.action == 'own':
+                    pending[step.target][each] = None
+                else:
+                    setattr(each, step.field, None)
+
+    deleted = defaultdict(int)
+    for each in links:
+        db_session.delete(each)
+        deleted[type(each).__name__] += 1
+    # 同一次 flush 中的 DELETE 不按外键排序, 先去掉所有指向被删除实例的引用
+    db_session.flush()
+    for table, each_table in pending.items():
+        for each in each_table:
+            db_session.delete(each)
+        if each_table:
+            deleted[table.__name__] += len(each_table)
+    return dict(deleted)
+
+
+# 以下为 `bulk_delete_<table>` 使用的语句, keys 每 chunk_size 个执行一次, 不加载实例。
+# 语句直接在数据库中执行, session 中已加载的被删除实例不会同步更新。
+
+def select_ids(column, key_column, keys: Collection[int], chunk_size: int = 500) -> Set[int]:
+    keys = list(keys)
+    ret = set()
+    for i in range(0, len(keys), chunk_size):
+        query = db_session.query(column).filter(key_column.in_(keys[i:i + chunk_size]), column.isnot(None))
+        ret.update(each for each, in query)
+    return ret
+
+
+def delete_in(deleted: Dict[str, int], column, keys: Collection[int], chunk_size: int = 500) -> None:
+    keys = list(keys)
+    table = column.class_
+    for i in range(0, len(keys), chunk_size):
+        deleted[table.__name__] += table.query.filter(column.in_(keys[i:i + chunk_size])).delete(
+            synchronize_session=False)
+
+
+def nullify_in(column, keys: Collection[int], chunk_size: int = 500) -> None:
+    keys = list(keys)
+    table = column.class_
+    for i in range(0, len(keys), chunk_size):
+        table.query.filter(column.in_(keys[i:i + chunk_size])).update({column: None}, synchronize_session=False)
+
+
+# progress(表名, 已删除数, 总数)
+Progress = Callable[[str, int, int], None]
+
+
+def delete_in_batches(deleted: Dict[str, int], table, keys: Collection[int], unlinks: tuple, nullifies: tuple,
+                      chunk_size: int = 500, progress: Optional[Progress] = None, commit: bool = False) -> None:
+    """
+    `delete_<table>_chunked` 使用: 每批 chunk_size 个 id, 在一个 SAVEPOINT 中删除关联表的行(unlinks 各列)、
+    置空外键(nullifies 各列)并删除 table 的行; 一批失败时只回滚这一批。
+    """
+    keys = sorted(keys)
+    for i in range(0, len(keys), chunk_size):
+        batch = keys[i:i + chunk_size]
+        with db_session.begin_nested():
+            for column in unlinks:
+                delete_in(deleted, column, batch, chunk_size)
+            for column in nullifies:
+                nullify_in(column, batch, chunk_size)
+            delete_in(deleted, table.id, batch, chunk_size)
+        if commit:
+            db_session.commit()
+        if progress is not None:
+            progress(table.__name__, i + len(batch), len(keys))
+
+
+def bulk_insert(table, rows: Iterable[dict], batch_size: int = 1000) -> int:
+    """
+    `bulk_insert_<table>` 使用: 每 batch_size 行执行一次 INSERT 的 executemany, 不构造实例, 不经过 unit of work。
+    在 db_session 当前的事务中执行, 由调用者提交。返回插入的行数。
+    """
+    statement = table.__table__.insert()
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return count
+        db_session.execute(statement, batch)
+        count += len(batch)
+
+
+def on_conflict_insert():
+    """
+    当前数据库支持 `INSERT ... ON CONFLICT` 时返回对应方言的 insert, 否则返回 None。
+    SQLite 需要 3.24 及以上, 且 SQLAlchemy 1.4 起才提供 `sqlalchemy.dialects.sqlite.insert`。
+    """
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite' and (engine.dialect.server_version_info or ()) >= (3, 24):
+        try:
+            from sqlalchemy.dialects.sqlite import insert
+        except ImportError:
+            return None
+        return insert
+    return None
+
+
+def upsert_by_select(table, key: str, batch: List[dict], updates: List[str]) -> None:
+    """
+    不支持 `ON CONFLICT` 时的 upsert: 先查出 batch 中已存在的键, 已存在的行以 executemany 更新 updates 中的列,
+    其余的行批量插入。与并发插入同一键的事务之间不是原子的, 冲突时由唯一约束抛出 IntegrityError。
+    """
+    column = table.__table__.c[key]
+    existing = {each for each, in db_session.query(column).filter(column.in_([row[key] for row in batch]))}
+    if existing and updates:
+        statement = table.__table__.update().where(column == bindparam('upsert_key'))
+        db_session.execute(statement, [dict({each: row[each] for each in updates}, upsert_key=row[key])
+                                       for row in batch if row[key] in existing])
+    inserts = [row for row in batch if row[key] not in existing]
+    if inserts:
+        db_session.execute(table.__table__.insert(), inserts)
+
+
+def upsert(table, key: str, rows: Iterable[dict], batch_size: int = 500) -> int:
+    """
+    `upsert_<table>_by_<field>` 使用: 每 batch_size 行执行一次 `INSERT ... ON CONFLICT (key) DO UPDATE` 的 executemany,
+    key 已存在时以新值更新行中给出的其他列(主键除外)。同一批中 key 相同的行只保留最后一行。
+    数据库不支持 `ON CONFLICT` 时(见 `on_conflict_insert`)改为 `upsert_by_select`。
+    在 db_session 当前的事务中执行。返回写入的行数。
+    """
+    insert = on_conflict_insert()
+    primary_keys = {each.name for each in table.__table__.primary_key.columns}
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list({row[key]: row for row in islice(rows, batch_size)}.values())
+        if not batch:
+            return count
+        updates = [column for column in batch[0] if column != key and column not in primary_keys]
+        if insert is None:
+            upsert_by_select(table, key, batch, updates)
+        else:
+            statement = insert(table.__table__)
+            if updates:
+                statement = statement.on_conflict_do_update(
+                    index_elements=[key], set_={column: statement.excluded[column] for column in updates})
+            else:
+                statement = statement.on_conflict_do_nothing(index_elements=[key])
+            db_session.execute(statement, batch)
+        count += len(batch)
+
+
+@contextmanager
+def bulk_load(*tables):
+    """
+    导入大量数据时使用: 进入时删除 tables(默认为所有表)的非唯一索引, 退出时(包括出错时)重建。
+    唯一索引与约束保留。进入与退出时各提交一次 db_session。
+
+        with bulk_load(User, UserCourse):
+            bulk_insert_user(users)
+            bulk_insert_user_course(links)
+    """
+    tables = [each.__table__ for each in tables] or Base.metadata.sorted_tables
+    indexes = [index for table in tables for index in sorted(table.indexes, key=lambda each: each.name)
+               if not index.unique]
+    connection = db_session.connection()
+    for index in indexes:
+        index.drop(connection)
+    db_session.commit()
+    try:
+        yield
+        db_session.commit()
+    except BaseException:
+        db_session.rollback()
+        raise
+    finally:
+        connection = db_session.connection()
+        for index in indexes:
+            index.create(connection)
+        db_session.commit()
+
+
 class Column:
     def __new__(cls, t, *args, **kwargs):
         if 'sqlalchemy' not in t.__module__:
@@ -340,8 +736,301 @@ class Column:
         return _Column(t, *args, **kwargs)
 
 
+class DeleteQueue(Base):
+    """
+    待后台删除的实体, 见 `enqueue_delete` 与 `run_delete_worker`。
+    """
+    __tablename__ = 'dbg_delete_queue'
+
+    id = Column(Integer, Sequence('dbg_delete_queue_id_seq'), nullable=False, primary_key=True)
+    table = Column(String(64), nullable=False)
+    entity_id = Column(BigInteger, nullable=False)
+    enqueued_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # 被 worker 领取的时间, 超过租期未完成时可以被重新领取
+    claimed_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String(1024), nullable=True)
+
+
+class HiLoBlock(Base):
+    """
+    `HiLo` 的进度: 各表下一段可保留的 id 的起点。
+    """
+    __tablename__ = 'dbg_hilo'
+
+    name = Column(String(64), nullable=False, primary_key=True)
+    next_id = Column(BigInteger, nullable=False)
+
+
+# 表名 => `~hilo` 或 `~snowflake` 的 id 分配器
+id_generators: Dict[str, Callable[[], int]] = {}
+
+
+def next_id(table) -> int:
+    """
+    在客户端为 `~hilo` 或 `~snowflake` 的表分配一个 id, 插入前即可用于关联表的行与外键。
+    """
+    return id_generators[table.__tablename__]()
+
+
+class HiLo:
+    """
+    hi/lo 分配 id: 每次在 dbg_hilo 中为表保留 block_size 个连续的 id, 之后在进程内分配, 不访问数据库。
+    第一次保留时从表中已有的最大 id 之后开始。保留在单独的短事务中进行;
+    SQLite 同一时刻只允许一个写事务, 因此在 db_session 的事务中保留, 该事务回滚时丢弃保留的 id。
+    """
+    block_size = 1000
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.next = self.stop = 0
+        # SQLite 上保留了 id、尚未提交的连接
+        self.pending = None
+        id_generators[name] = self
+
+    def __call__(self) -> int:
+        with self.lock:
+            if self.next >= self.stop:
+                self.next = self.reserve()
+                self.stop = self.next + self.block_size
+            self.next += 1
+            return self.next - 1
+
+    def reserve(self) -> int:
+        if engine.dialect.name == 'sqlite':
+            self.pending = db_session.connection()
+            return self.reserve_on(self.pending)
+        try:
+            with engine.begin() as connection:
+                return self.reserve_on(connection)
+        except IntegrityError:
+            # 另一个进程同时插入了该表的第一行
+            with engine.begin() as connection:
+                return self.reserve_on(connection)
+
+    def reserve_on(self, connection) -> int:
+        hilo = HiLoBlock.__table__
+        condition = hilo.c.name == self.name
+        if connection.execute(hilo.update().where(condition).values(next_id=hilo.c.next_id + self.block_size)).rowcount:
+            return connection.execute(hilo.select().where(condition)).first().next_id - self.block_size
+        table = Base.metadata.tables[self.name]
+        start = (connection.execute(func.max(table.c.id).select()).scalar() or 0) + 1
+        connection.execute(hilo.insert().values(name=self.name, next_id=start + self.block_size))
+        return start
+
+    def settle(self, connection, committed: bool) -> None:
+        with self.lock:
+            if self.pending is not None and self.pending is connection:
+                self.pending = None
+                if not committed:
+                    self.next = self.stop = 0
+
+
+@event.listens_for(engine, 'commit')
+def settle_reserved_ids(connection):
+    for each in id_generators.values():
+        if isinstance(each, HiLo):
+            each.settle(connection, committed=True)
+
+
+@event.listens_for(engine, 'rollback')
+def discard_reserved_ids(connection):
+    for each in id_generators.values():
+        if isinstance(each, HiLo):
+            each.settle(connection, committed=False)
+
+
+def snowflake_worker_id() -> int:
+    worker_id = getattr(Config, 'worker_id', None)
+    if worker_id is None:
+        worker_id = os.environ.get('DBG_WORKER_ID')
+    return (os.getpid() if worker_id is None else int(worker_id)) & 0x3ff
+
+
+class Snowflake:
+    """
+    按时间递增的 64 位 id, 不访问数据库: 自 2020-01-01 起的毫秒数(41 位) | worker id(10 位) | 同一毫秒内的序号(12 位)。
+    同时写入的各进程的 worker id 须不同: 取 Config.worker_id 或环境变量 DBG_WORKER_ID, 都没有时取进程号的低 10 位。
+    """
+    epoch = 1577836800000
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.last = -1
+        self.sequence = 0
+        self.pid = None
+        self.worker_id = 0
+        id_generators[name] = self
+
+    def __call__(self) -> int:
+        with self.lock:
+            if self.pid != os.getpid():
+                # fork 之后的子进程重新取 worker id
+                self.pid = os.getpid()
+                self.worker_id = snowflake_worker_id()
+            now = int(time.time() * 1000)
+            if now <= self.last:
+                # 同一毫秒内, 或时钟回拨时沿用上一毫秒; 序号用尽时等到下一毫秒
+                now = self.last
+                self.sequence = (self.sequence + 1) & 0xfff
+                while not self.sequence and now <= self.last:
+                    time.sleep(0.0001)
+                    now = int(time.time() * 1000)
+            else:
+                self.sequence = 0
+            self.last = now
+            return (now - self.epoch) << 22 | self.worker_id << 12 | self.sequence
+
+
 ##{table_def}##
 
 Base.metadata.create_all(bind=engine)
 
 ##{methods}##
+
+
+def enqueue_delete(entity) -> DeleteQueue:
+    """
+    标记 entity 待删除并立即返回, 它及其拥有的对象由 `run_delete_worker` 在后台以 `delete_<table>_chunked` 删除。
+    与调用者的其他修改一同提交。
+    """
+    row = DeleteQueue(table=type(entity).__name__, entity_id=entity.id)
+    db_session.add(row)
+    return row
+
+
+def queued_for_delete(entity_type: type) -> 'Query':
+    """
+    entity_type 中已标记待删除的 id, 可用于在查询中排除它们: `User.id.notin_(queued_for_delete(User))`。
+    """
+    return db_session.query(DeleteQueue.entity_id).filter(DeleteQueue.table == entity_type.__name__)
+
+
+class DeleteQueueMetrics:
+    """
+    `run_delete_worker` 的统计, 线程安全; 可以在 worker 运行时从其他线程读取。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.claimed = 0
+        self.done = 0
+        self.failed = 0
+        # 在途的项达到上限, 须等待完成才能继续领取的次数
+        self.throttled = 0
+        self.deleted: Dict[str, int] = defaultdict(int)
+        # 各项删除耗时之和
+        self.busy_seconds = 0.0
+
+    def record(self, deleted: Optional[Dict[str, int]], seconds: float) -> None:
+        with self.lock:
+            self.busy_seconds += seconds
+            if deleted is None:
+                self.failed += 1
+                return
+            self.done += 1
+            for table, count in deleted.items():
+                self.deleted[table] += count
+
+    def __repr__(self):
+        return (f'DeleteQueueMetrics(claimed={self.claimed}, done={self.done}, failed={self.failed}, '
+                f'throttled={self.throttled}, busy_seconds={self.busy_seconds:.3f}, deleted={dict(self.deleted)})')
+
+
+def claim_deletes(limit: int, lease: float, max_attempts: int) -> List[Tuple[int, str, int]]:
+    """
+    领取至多 limit 项未被领取(或租期已过)且尝试次数未达到 max_attempts 的项, 返回 (id, 表名, 实体 id)。
+    postgresql 上以 `FOR UPDATE SKIP LOCKED` 避免多个 worker 领取同一项。
+    """
+    now = datetime.utcnow()
+    rows = DeleteQueue.query.filter(
+        or_(DeleteQueue.claimed_at.is_(None), DeleteQueue.claimed_at < now - timedelta(seconds=lease)),
+        DeleteQueue.attempts < max_attempts).order_by(DeleteQueue.id).limit(limit).with_for_update(
+        skip_locked=True).all()
+    for row in rows:
+        row.claimed_at = now
+        row.attempts += 1
+    claimed = [(row.id, row.table, row.entity_id) for row in rows]
+    db_session.commit()
+    return claimed
+
+
+def process_delete(item: Tuple[int, str, int], chunk_size: int, metrics: DeleteQueueMetrics) -> None:
+    """
+    在 worker 线程中删除一项; 成功时移出队列, 失败时记录错误并释放, 之后重新领取。
+    """
+    queue_id, table_name, entity_id = item
+    start = time.perf_counter()
+    deleted = None
+    try:
+        entity_type = next(each for each in DeleteManager.chunked_delete_events if each.__name__ == table_name)
+        entity = entity_type.query.get(entity_id)
+        deleted = {} if entity is None else DeleteManager.get_chunked_delete_fn(entity_type)(
+            entity, chunk_size, commit=True)
+        DeleteQueue.query.filter_by(id=queue_id).delete(synchronize_session=False)
+        db_session.commit()
+    except Exception as e:
+        deleted = None
+        db_session.rollback()
+        DeleteQueue.query.filter_by(id=queue_id).update(
+            {DeleteQueue.claimed_at: None, DeleteQueue.error: f'{type(e).__name__}: {e}'[:1024]},
+            synchronize_session=False)
+        db_session.commit()
+    finally:
+        # scoped_session 按线程区分, 线程池中的线程会被复用
+        db_session.remove()
+        metrics.record(deleted, time.perf_counter() - start)
+
+
+class InlineExecutor:
+    """
+    在调用线程中立即执行的 executor。SQLite 同一时刻只允许一个写事务, 并发的事务在先读后写时直接失败,
+    因此 `run_delete_worker` 在 SQLite 上逐项执行。
+    """
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def run_delete_worker(workers: int = 4, batch_size: int = 100, max_in_flight: Optional[int] = None,
+                      chunk_size: int = 500, lease: float = 600, max_attempts: int = 3, forever: bool = False,
+                      poll: float = 1.0, metrics: Optional[DeleteQueueMetrics] = None) -> DeleteQueueMetrics:
+    """
+    后台删除 DeleteQueue 中的实体: 每次领取至多 batch_size 项, 交给 workers 个线程执行 `delete_<table>_chunked`。
+    在途的项不超过 max_in_flight(默认 workers * 2), 达到上限时先等待已提交的项完成再领取。
+    失败的项最多尝试 max_attempts 次, 之后留在队列中并带有 error。
+    forever 为假时队列清空后返回, 否则每 poll 秒轮询一次。SQLite 上在调用线程中逐项执行。
+    """
+    metrics = metrics or DeleteQueueMetrics()
+    max_in_flight = max_in_flight or workers * 2
+    in_flight = set()
+    executor = InlineExecutor() if engine.dialect.name == 'sqlite' else ThreadPoolExecutor(workers)
+    with executor as pool:
+        while True:
+            # 每轮至少有一项完成, 总有空位
+            claimed = claim_deletes(min(batch_size, max_in_flight - len(in_flight)), lease, max_attempts)
+            in_flight.update(pool.submit(process_delete, each, chunk_size, metrics) for each in claimed)
+            with metrics.lock:
+                metrics.claimed += len(claimed)
+                metrics.throttled += len(in_flight) >= max_in_flight
+            if in_flight:
+                _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            elif forever:
+                time.sleep(poll)
+            else:
+                break
+    db_session.remove()
+    return metrics
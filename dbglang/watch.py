@@ -0,0 +1,116 @@
+"""
+dbgc --watch: 常驻进程, 源文件变化时重新生成。
+
+解析器、已编译的 Fragment 以及各表的渲染结果都保存在内存中,
+每次只重新解析发生变化的文件, 只重新渲染定义发生变化的表。
+"""
+import os
+import sys
+import time
+import traceback
+from typing import Dict, Optional, Sequence, Tuple
+from .cache import CompileCache, test_samples_file
+from .code_gen import Analyzer
+from .dbg_compiler import analyzer_options
+from .link import Fragment, LinkError, build
+from .table_info_gen import SchemaError
+
+
+class MemoryFragmentCache:
+    """
+    以 (路径, mtime, size) 为键的 Fragment 缓存, 未命中时回落到磁盘缓存。
+    """
+
+    def __init__(self, disk: Optional[CompileCache] = None):
+        self.disk = disk
+        self.fragments: Dict[str, Tuple[Tuple[int, int], Fragment]] = {}
+
+    @staticmethod
+    def stamp(filename: str) -> Tuple[int, int]:
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load_fragment(self, filename: str, legacy: bool = False) -> Optional[Fragment]:
+        cached = self.fragments.get(filename)
+        if cached and cached[0] == self.stamp(filename):
+            return cached[1]
+        fragment = self.disk.load_fragment(filename, legacy) if self.disk else None
+        if fragment is not None:
+            self.fragments[filename] = self.stamp(filename), fragment
+        return fragment
+
+    def store_fragment(self, filename: str, fragment: Fragment, legacy: bool = False) -> None:
+        self.fragments[filename] = self.stamp(filename), fragment
+        if self.disk:
+            self.disk.store_fragment(filename, fragment, legacy)
+
+
+class Watcher:
+
+    def __init__(self, input_file: str, out_file: str, conf: Sequence[str], imports: Dict[str, str],
+                 flags: Dict[str, object], cache: Optional[CompileCache] = None):
+        self.input_file = input_file
+        self.out_file = out_file
+        self.conf = conf
+        self.imports = imports
+        self.flags = flags
+        self.cache = cache
+        self.fragments = MemoryFragmentCache(cache)
+        self.memo = {}
+        self.sources: Dict[str, Tuple[int, int]] = {}
+
+    def rebuild(self) -> None:
+        handler, sources = build(self.input_file, jobs=1, cache=self.fragments,
+                                 legacy=self.flags.get('legacy_parser', False), lazy=self.flags.get('lazy'),
+                                 fk_relations=bool(self.flags.get('fk_relations')),
+                                 db_cascade=bool(self.flags.get('db_cascade')))
+        self.sources = {filename: self.fragments.stamp(filename) for filename in sources}
+        # 与 build 相同, 默认在本进程中执行: 每次只重新渲染改动过的表
+        options = analyzer_options(self.flags)
+        options.setdefault('jobs', 1)
+        Analyzer(handler, *self.conf, memo=self.memo, **options, **self.imports).generate(self.out_file)
+        if self.cache:
+            outputs = (self.out_file, test_samples_file(self.out_file))
+            self.cache.store(self.cache.key(self.input_file, self.imports, self.conf, self.flags), sources, outputs)
+
+    def changed(self) -> bool:
+        for filename, stamp in self.sources.items():
+            try:
+                if MemoryFragmentCache.stamp(filename) != stamp:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def rebuild_and_report(self) -> None:
+        start = time.perf_counter()
+        try:
+            self.rebuild()
+        except (SyntaxError, LinkError, SchemaError) as e:
+            print(f'dbgc: {e}', file=sys.stderr)
+            self.watch_after_error()
+            return
+        except Exception:
+            traceback.print_exc()
+            self.watch_after_error()
+            return
+        print(f'dbgc: generated {self.out_file} in {time.perf_counter() - start:.3f}s', file=sys.stderr)
+
+    def watch_after_error(self) -> None:
+        # 出错时仍然监视出错前已知的文件以及入口文件
+        self.sources.setdefault(os.path.abspath(self.input_file), None)
+        for filename in self.sources:
+            try:
+                self.sources[filename] = MemoryFragmentCache.stamp(filename)
+            except FileNotFoundError:
+                pass
+
+    def run(self, interval: float = 0.5) -> None:
+        self.rebuild_and_report()
+        try:
+            while True:
+                time.sleep(interval)
+                if self.changed():
+                    self.rebuild_and_report()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,56 @@
+"""
+测试共用的 fixture: 把 schema 编译到临时目录, 导入生成的模块。
+"""
+import importlib
+import os
+import sys
+import pytest
+from dbglang import dbg_compiler
+
+MEMORY_DATABASE = "database_url = 'sqlite://'; database_connect_options = {}"
+
+
+def require_sqlalchemy():
+    sqlalchemy = pytest.importorskip('sqlalchemy')
+    if int(sqlalchemy.__version__.split('.')[0]) >= 2:
+        pytest.skip('生成的代码使用 SQLAlchemy 1.x 的接口')
+
+
+@pytest.fixture
+def generate(tmp_path):
+    """
+    generate(schema, *flags, config=...) 把 schema 文本编译为 tmp_path 下的 `<name>.py`, 返回其路径。
+    """
+    def generate(schema: str, *flags: str, name: str = 'models', config: str = MEMORY_DATABASE) -> str:
+        input_file = tmp_path / f'{name}.dbg'
+        input_file.write_text(schema, encoding='utf8')
+        out_file = str(tmp_path / f'{name}.py')
+        dbg_compiler.compile(str(input_file), out_file, '--no-cache', '--samples=1', *flags, config)
+        return out_file
+
+    return generate
+
+
+@pytest.fixture
+def load(generate):
+    """
+    load(schema, *flags, config=...) 编译并导入生成的模块; 测试结束时关闭会话与连接。
+    """
+    require_sqlalchemy()
+    modules = []
+
+    def load(schema: str, *flags: str, name: str = 'models', config: str = MEMORY_DATABASE):
+        out_file = generate(schema, *flags, name=name, config=config)
+        sys.path.insert(0, os.path.dirname(out_file))
+        try:
+            module = importlib.import_module(name)
+        finally:
+            sys.path.pop(0)
+            sys.modules.pop(name, None)
+        modules.append(module)
+        return module
+
+    yield load
+    for module in modules:
+        module.db_session.remove()
+        module.engine.dispose()
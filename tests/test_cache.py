@@ -0,0 +1,109 @@
+"""
+编译缓存(cache.py): import 的文件修改后不再命中, 不影响输出的选项不改变缓存键。
+"""
+import pytest
+from dbglang import dbg_compiler
+from dbglang.cache import CompileCache, test_samples_file as samples_file
+from dbglang.dbg_compiler import split_flags
+
+MAIN = """
+import users
+
+Course(id: int~){
+    title: NameStr
+}
+
+User <<->> Course{
+}
+"""
+
+USERS = """
+User(id: int~){
+    name: NameStr
+}
+"""
+
+CONFIG = "database_url = 'sqlite://'; database_connect_options = {}"
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / 'main.dbg').write_text(MAIN, encoding='utf8')
+    (tmp_path / 'users.dbg').write_text(USERS, encoding='utf8')
+    return tmp_path
+
+
+def compile_project(project, *flags):
+    out_file = project / 'out.py'
+    dbg_compiler.compile(str(project / 'main.dbg'), str(out_file), f'--cache-dir={project / "cache"}',
+                         '--samples=1', *flags, CONFIG)
+    return out_file.read_text(encoding='utf8')
+
+
+def cache_key(project, *args):
+    flags, _ = split_flags(args)
+    return CompileCache(str(project / 'cache')).key(str(project / 'main.dbg'), {}, (CONFIG,), flags)
+
+
+def outputs(project):
+    out_file = str(project / 'out.py')
+    return out_file, samples_file(out_file)
+
+
+def test_hit_restores_outputs(project):
+    source = compile_project(project)
+    (project / 'out.py').unlink()
+    assert CompileCache(str(project / 'cache')).restore(cache_key(project, '--samples=1'), outputs(project))
+    assert (project / 'out.py').read_text(encoding='utf8') == source
+
+
+def test_imported_file_edit_invalidates(project):
+    source = compile_project(project)
+    assert 'email' not in source
+    (project / 'users.dbg').write_text(USERS.replace('name: NameStr', 'name: NameStr\n    email: NameStr?'),
+                                       encoding='utf8')
+    # 入口文件未变, 键相同, 但清单中 users.dbg 的内容不同
+    cache = CompileCache(str(project / 'cache'))
+    assert not cache.restore(cache_key(project, '--samples=1'), outputs(project))
+    assert 'email' in compile_project(project)
+
+
+def test_missing_import_invalidates(project):
+    compile_project(project)
+    (project / 'users.dbg').unlink()
+    cache = CompileCache(str(project / 'cache'))
+    assert not cache.restore(cache_key(project, '--samples=1'), outputs(project))
+
+
+@pytest.mark.parametrize('flag', ['--jobs=1', '--jobs=4', '--profile', '--profile=out.prof', '--legacy-parser',
+                                  '--no-cache', '--cache-dir=elsewhere'])
+def test_output_neutral_flags_keep_key(project, flag):
+    assert cache_key(project, '--samples=1', flag) == cache_key(project, '--samples=1')
+
+
+@pytest.mark.parametrize('flag', ['--samples=2', '--fk-relations', '--db-cascade', '--lazy=selectin'])
+def test_output_flags_change_key(project, flag):
+    assert cache_key(project, '--samples=1', flag) != cache_key(project, '--samples=1')
+
+
+def test_neutral_flags_hit_cache(project):
+    source = compile_project(project)
+    (project / 'out.py').write_text('', encoding='utf8')
+    # 命中缓存时不需要 Ruikowa: --legacy-parser 不参与编译
+    assert compile_project(project, '--jobs=2', '--legacy-parser') == source
+
+
+def test_fragment_cache(project):
+    cache = CompileCache(str(project / 'cache'))
+    filename = str(project / 'users.dbg')
+    key = cache.fragment_key(filename, False)
+    assert cache.load_fragment(filename) is None
+    compile_project(project)
+    fragment = cache.load_fragment(filename)
+    assert list(fragment.tables) == ['User']
+    # 两个解析器的片段分开缓存
+    assert cache.fragment_key(filename, True) != key
+
+    (project / 'users.dbg').write_text(USERS.replace('User', 'Member'), encoding='utf8')
+    assert cache.fragment_key(filename, False) != key
+    assert cache.load_fragment(filename) is None
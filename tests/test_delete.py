@@ -0,0 +1,168 @@
+"""
+按所有权删除: `delete_<t>`, `bulk_delete_<t>` 与 `delete_<t>_chunked` 在 `--fk-relations` / `--db-cascade` 的各种组合下
+删除相同的行, 所有权成环时编译报错。
+"""
+import pytest
+from dbglang import dbg_compiler
+from dbglang.delete_plan import OwnershipCycle
+
+# User 经关联表拥有 Course(多对多), Course 拥有多个 Note(一对多), User 拥有一个 Profile(一对一);
+# Tag 不拥有 Note, 删除 Tag 只解除关系。
+SCHEMA = """
+User(id: int~){
+    name: NameStr!
+}
+
+Course(id: int~){
+    title: NameStr?
+}
+
+Note(id: int~){
+    text: TextStr?
+}
+
+Profile(id: int~){
+    bio: TextStr?
+}
+
+Tag(id: int~){
+    name: NameStr?
+}
+
+User^ <<->> Course{
+}
+
+Course^ <->> Note{
+}
+
+User^ <-> Profile{
+}
+
+Note <<-> Tag{
+}
+"""
+
+MODES = [(), ('--fk-relations',), ('--db-cascade',), ('--fk-relations', '--db-cascade')]
+
+
+@pytest.fixture(params=MODES, ids=lambda flags: ' '.join(flags) or 'default')
+def models(request, load):
+    from sqlalchemy import event
+    module = load(SCHEMA, *request.param)
+
+    # 各种方式下都检查外键约束
+    @event.listens_for(module.engine, 'connect')
+    def foreign_keys_on(connection, _):
+        connection.execute('PRAGMA foreign_keys=ON')
+
+    module.engine.dispose()
+    module.Base.metadata.create_all(module.engine)
+    populate(module)
+    return module
+
+
+def link(module, a: str, b: str, a_id: int, b_id: int):
+    session = module.db_session
+    names = vars(module)
+    if a + b in names:
+        session.add(names[a + b](**{f'{a.lower()}_id': a_id, f'{b.lower()}_id': b_id}))
+        return
+    foreign_keys = module.ForeignKeys
+    A, B = names[a], names[b]
+    if B in foreign_keys.get(A, {}):
+        session.query(A).filter_by(id=a_id).update({foreign_keys[A][B]: b_id})
+    else:
+        session.query(B).filter_by(id=b_id).update({foreign_keys[B][A]: a_id})
+
+
+def populate(module):
+    """
+    User 1 拥有 Course 1, 2 与 Profile 1; User 2 拥有 Course 3 与 Profile 2; Course 4 没有拥有者。
+    Course c 拥有 Note 2c-1, 2c; 所有 Note 关联 Tag 1。
+    """
+    session = module.db_session
+    session.add_all([module.User(id=i, name=f'u{i}') for i in (1, 2)] +
+                    [module.Course(id=i) for i in range(1, 5)] +
+                    [module.Note(id=i) for i in range(1, 9)] +
+                    [module.Profile(id=i) for i in (1, 2)] +
+                    [module.Tag(id=1)])
+    session.flush()
+    for user_id, course_ids in ((1, (1, 2)), (2, (3,))):
+        for course_id in course_ids:
+            link(module, 'User', 'Course', user_id, course_id)
+    for course_id in range(1, 5):
+        for note_id in (2 * course_id - 1, 2 * course_id):
+            link(module, 'Course', 'Note', course_id, note_id)
+    for user_id in (1, 2):
+        link(module, 'User', 'Profile', user_id, user_id)
+    for note_id in range(1, 9):
+        link(module, 'Note', 'Tag', note_id, 1)
+    session.commit()
+
+
+def remaining(module):
+    return {name: sorted(each.id for each in getattr(module, name).query)
+            for name in ('User', 'Course', 'Note', 'Profile', 'Tag')}
+
+
+AFTER_USER_1 = {'User': [2], 'Course': [3, 4], 'Note': [5, 6, 7, 8], 'Profile': [2], 'Tag': [1]}
+
+
+def test_delete(models):
+    deleted = models.delete_user(models.User.query.get(1))
+    models.db_session.commit()
+    assert deleted['User'] == 1
+    assert remaining(models) == AFTER_USER_1
+    if hasattr(models, 'UserCourse'):
+        assert models.UserCourse.query.count() == 1
+
+
+def test_bulk_delete(models):
+    deleted = models.bulk_delete_user([1, 2])
+    models.db_session.commit()
+    assert deleted['User'] == 2
+    assert remaining(models) == {'User': [], 'Course': [4], 'Note': [7, 8], 'Profile': [], 'Tag': [1]}
+
+
+def test_bulk_delete_empty(models):
+    models.bulk_delete_user([])
+    models.db_session.commit()
+    assert remaining(models)['User'] == [1, 2]
+
+
+def test_delete_chunked(models):
+    progress = []
+    deleted = models.delete_user_chunked(models.User.query.get(1), chunk_size=1,
+                                         progress=lambda *args: progress.append(args), commit=True)
+    assert deleted['User'] == 1
+    assert remaining(models) == AFTER_USER_1
+    # 被拥有的表先于拥有者删除, 每批一个 id
+    assert progress[-1] == ('User', 1, 1)
+    assert ('Note', 4, 4) in progress and ('Note', 1, 4) in progress
+    assert progress.index(('Note', 4, 4)) < progress.index(('Course', 2, 2)) < progress.index(('User', 1, 1))
+
+
+def test_delete_unlinks_non_owner(models):
+    models.delete_tag(models.Tag.query.get(1))
+    models.db_session.commit()
+    assert remaining(models) == {'User': [1, 2], 'Course': [1, 2, 3, 4], 'Note': list(range(1, 9)),
+                                 'Profile': [1, 2], 'Tag': []}
+    if hasattr(models, 'NoteTag'):
+        assert models.NoteTag.query.count() == 0
+    else:
+        assert {note.tag_id for note in models.Note.query} == {None}
+
+
+@pytest.mark.parametrize('relations', ['A^ <-> B^{\n}\n',
+                                       'A^ <<->> B{\n}\n\nB^ <->> C{\n}\n\nC^ <-> A{\n}\n'])
+@pytest.mark.parametrize('flags', MODES)
+def test_ownership_cycle(tmp_path, relations, flags):
+    tables = ''.join(f'{name}(id: int~){{\n}}\n\n' for name in 'ABC')
+    input_file = tmp_path / 'cycle.dbg'
+    input_file.write_text(tables + relations, encoding='utf8')
+    out_file = tmp_path / 'cycle.py'
+    with pytest.raises(OwnershipCycle) as info:
+        dbg_compiler.compile(str(input_file), str(out_file), '--no-cache', '--samples=1', *flags,
+                             "database_url = 'sqlite://'; database_connect_options = {}")
+    assert info.value.cycle[0] == info.value.cycle[-1]
+    assert not out_file.exists()
@@ -0,0 +1,25 @@
+"""
+生成的代码与哈希随机化无关: 不同 PYTHONHASHSEED 下编译 db.dbg 得到逐字节相同的输出。
+"""
+import os
+import subprocess
+import sys
+import pytest
+from dbglang.cache import test_samples_file as samples_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = "database_url = 'sqlite://'; database_connect_options = {}"
+
+
+def compile_with_seed(tmp_path, seed: str, *flags: str):
+    out_file = str(tmp_path / f'out_{seed}.py')
+    env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, '-m', 'dbglang', os.path.join(ROOT, 'db.dbg'), out_file, '--no-cache',
+                    '--samples=2', *flags, CONFIG], env=env, cwd=str(tmp_path), check=True)
+    with open(out_file, 'rb') as f, open(samples_file(out_file), 'rb') as samples:
+        return f.read(), samples.read()
+
+
+@pytest.mark.parametrize('flags', [(), ('--fk-relations',), ('--fk-relations', '--db-cascade')])
+def test_output_independent_of_hash_seed(tmp_path, flags):
+    assert compile_with_seed(tmp_path, '1', *flags) == compile_with_seed(tmp_path, '2', *flags)
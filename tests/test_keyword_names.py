@@ -0,0 +1,54 @@
+"""
+表名与关键字相同(`Class`, `As`)时, `<<->>` 关系生成的属性名带后缀 `_`, 生成的模块可以导入。
+"""
+import importlib
+import os
+import sys
+import pytest
+from dbglang import dbg_compiler
+
+SCHEMA = os.path.join(os.path.dirname(__file__), 'schemas', 'keyword_relation.dbg')
+
+
+@pytest.fixture(params=[(), ('--fk-relations',), ('--legacy-parser',)])
+def generated(request, tmp_path):
+    out_file = str(tmp_path / 'keyword_models.py')
+    dbg_compiler.compile(SCHEMA, out_file, '--no-cache', '--samples=1', *request.param,
+                         "database_url = 'sqlite://'; database_connect_options = {}")
+    return out_file
+
+
+def test_generated_source_compiles(generated):
+    with open(generated, encoding='utf8') as f:
+        source = f.read()
+    compile(source, generated, 'exec')
+    assert 'def class(' not in source and 'def as(' not in source
+
+
+def test_association_back_references(generated):
+    sqlalchemy = pytest.importorskip('sqlalchemy')
+    if int(sqlalchemy.__version__.split('.')[0]) >= 2:
+        pytest.skip('生成的代码使用 SQLAlchemy 1.x 的接口')
+    sys.path.insert(0, os.path.dirname(generated))
+    try:
+        module = importlib.import_module('keyword_models')
+    finally:
+        sys.path.pop(0)
+        sys.modules.pop('keyword_models', None)
+    session = module.db_session
+    try:
+        session.add_all([module.Class(id=1, name='c'), module.Student(id=1, name='s'), module.A(id=1),
+                         module.As(id=1), module.ClassStudent(class_id=1, student_id=1),
+                         module.AAs(a_id=1, as_id=1)])
+        session.commit()
+        link = session.query(module.AAs).one()
+        assert (link.a.id, link.as_.id) == (1, 1)
+        assert session.query(module.ClassStudent).one().class_.id == 1
+        assert module.prefetch([link], 'as_') == [link]
+
+        assert module.delete_a(session.query(module.A).one())['As'] == 1
+        session.commit()
+        assert session.query(module.As).count() == 0
+    finally:
+        session.remove()
+        module.engine.dispose()
@@ -0,0 +1,120 @@
+"""
+多文件的链接(link.py): 未定义与重复定义的表报 `LinkError`, 允许循环 import, 并行编译不改变输出。
+"""
+import pytest
+from dbglang import dbg_compiler
+from dbglang.cache import test_samples_file as samples_file
+from dbglang.link import LinkError, build, link_order, load_fragments
+
+CONFIG = "database_url = 'sqlite://'; database_connect_options = {}"
+
+FILES = {
+    'main': """
+import users
+import courses
+
+User <<->> Course{
+    score: int?
+}
+""",
+    'users': """
+import main
+import courses
+
+User(id: int~){
+    name: NameStr
+}
+
+User <<-> Post{
+}
+
+Post(id: int~){
+    title: NameStr
+}
+""",
+    'courses': """
+import users
+
+Course(id: int~){
+    title: NameStr
+}
+
+Teacher(id: int~){
+    name: NameStr
+}
+
+Teacher^ <<-> Course{
+}
+""",
+}
+
+
+def write_files(directory, files):
+    for name, source in files.items():
+        (directory / f'{name}.dbg').write_text(source, encoding='utf8')
+    return str(directory / 'main.dbg')
+
+
+def compile_outputs(directory, *flags):
+    out_file = str(directory / 'out.py')
+    dbg_compiler.compile(str(directory / 'main.dbg'), out_file, '--no-cache', '--samples=2', *flags, CONFIG)
+    return [open(each, 'rb').read() for each in (out_file, samples_file(out_file))]
+
+
+def test_cyclic_imports(tmp_path):
+    entry = write_files(tmp_path, FILES)
+    fragments = load_fragments(entry, jobs=1)
+    assert sorted(fragments) == sorted(str(tmp_path / f'{name}.dbg') for name in FILES)
+    # 被 import 的文件在前, 入口文件在最后
+    assert link_order(entry, fragments)[-1] == entry
+
+    handler, sources = build(entry, jobs=1)
+    assert {'Course', 'Post', 'Teacher', 'User', 'UserCourse'} <= set(handler.tables)
+    assert sorted(sources) == sorted(fragments)
+
+
+def test_jobs_output_identical(tmp_path):
+    write_files(tmp_path, FILES)
+    serial = compile_outputs(tmp_path, '--jobs=1')
+    assert compile_outputs(tmp_path, '--jobs=2') == serial
+    assert compile_outputs(tmp_path) == serial
+
+
+def test_undefined_table(tmp_path):
+    entry = write_files(tmp_path, dict(FILES, main=FILES['main'] + '\nUser <<-> Missing{\n}\n'))
+    with pytest.raises(LinkError, match='undefined table Missing'):
+        build(entry, jobs=1)
+
+
+def test_undefined_table_without_import(tmp_path):
+    # 表定义在未被 import 的文件中
+    entry = write_files(tmp_path, dict(FILES, main=FILES['main'].replace('import courses\n', ''),
+                                       users=FILES['users'].replace('import courses\n', '')))
+    with pytest.raises(LinkError, match='undefined table Course'):
+        build(entry, jobs=1)
+
+
+def test_duplicate_table(tmp_path):
+    courses = FILES['courses'] + '\nUser(id: int~){\n    nickname: NameStr\n}\n'
+    entry = write_files(tmp_path, dict(FILES, courses=courses))
+    with pytest.raises(LinkError, match='table User is defined in both'):
+        build(entry, jobs=1)
+
+
+def test_missing_import(tmp_path):
+    entry = write_files(tmp_path, dict(FILES, main='import nowhere\n' + FILES['main']))
+    with pytest.raises(LinkError, match='cannot find imported file'):
+        build(entry, jobs=1)
+
+
+def test_jobs_default(tmp_path, monkeypatch):
+    from dbglang import code_gen
+    from dbglang.parallel import process_count
+    monkeypatch.setattr('os.cpu_count', lambda: 2)
+    assert process_count(None) == 2 and process_count(1) == 1
+    handler, _ = build(write_files(tmp_path, FILES))
+    assert code_gen.Analyzer(handler).jobs == 2
+    # 未给出 --jobs 时, 表足够多才在进程池中生成代码
+    serial = compile_outputs(tmp_path, '--jobs=1')
+    monkeypatch.setattr(code_gen, 'min_parallel_tables', 2)
+    assert compile_outputs(tmp_path) == serial
@@ -0,0 +1,151 @@
+"""
+手写的递归下降解析器(rdp.py, scanner.py)与 Ruikowa 生成的解析器(dbp.py)得到相同的 AST。
+"""
+import os
+import pytest
+from dbglang.rdp import DSLSyntaxError, parse as rd_parse
+from dbglang.scanner import scan
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    'comments': """
+# 文件开头的注释
+User(id: int~){   # 行尾注释
+    # 表内的注释
+    name: NameStr  # 字段后的注释
+}
+# 文件末尾的注释""",
+    'keyword names': """
+Class(id: int~){
+    import: NameStr
+    lazy  : int = 0
+}
+
+As(id: int~){
+    repr: NameStr?
+}
+
+Class^ <<->> As{
+    index: int?
+}
+""",
+    'empty bodies': """
+A(id: int~){}
+
+B(id: int~)
+{
+
+}
+
+A <-> B{}
+
+A <<-> B
+{
+}
+""",
+    'options and defaults': """
+User(id: int~hilo, other: int){
+    name : NameStr!@
+    email: NameStr?!
+    cost : int = 0
+    since: datetime = datetime.now()
+    repr = all
+}
+""",
+    'indexes': """
+User(id: int~snowflake){
+    name   : NameStr
+    cost   : int = 0
+    deleted: int = 0
+
+    index{name, cost} include{deleted}
+    unique{
+        name
+    } where deleted = 0
+    repr{
+        id, name
+    }
+}
+""",
+    'relations': """
+import common
+import shared.users
+
+User^^ <<->> Course{
+    score: int?
+    lazy = selectin
+}
+
+User <<-> Some^{
+    lazy = joined
+}
+""",
+}
+
+ERRORS = [
+    # (源码, 行, 列, 期望的内容)
+    ('User(id: int~){\n    name: NameStr\n}\n\nUser <<->> Course\n', 6, 1, "'{'"),
+    ('User(id: int~{\n}\n', 1, 14, "')'"),
+    ('User(id: int~){\n    name NameStr\n}\n', 2, 5, "'}'"),
+    ('User(id: int~){\n    cost: int =\n}\n', 2, 16, 'Default'),
+    ('User <<-- Course{}\n', 1, 9, "'>'"),
+    ('User(id: int~){\n    repr = some\n}\n', 2, 12, "'all'"),
+    ('123\n', 1, 1, 'Import, TableDef or Relation'),
+]
+
+
+def rd(source: str):
+    return rd_parse(scan(source), '<test>')
+
+
+def legacy(source: str):
+    pytest.importorskip('Ruikowa')
+    from dbglang.etoken import token
+    from dbglang.parse import legacy_parse
+    return legacy_parse(token(source), '<test>')
+
+
+def shape(node):
+    """
+    AST 的名字与结构, 不含 meta(两个解析器的 meta 含义不同)。
+    """
+    if isinstance(node, str):
+        return node
+    return node.name, [shape(each) for each in node]
+
+
+def test_db_dbg_matches_legacy():
+    with open(os.path.join(ROOT, 'db.dbg'), encoding='utf8') as f:
+        source = f.read()
+    assert shape(rd(source)) == shape(legacy(source))
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_matches_legacy(name):
+    source = CASES[name]
+    assert shape(rd(source)) == shape(legacy(source))
+
+
+def test_empty_bodies():
+    stmts = rd(CASES['empty bodies'])
+    assert [each.name for each in stmts] == ['TableDef', 'TableDef', 'Relation', 'Relation']
+    assert all(len(each[-1]) == 0 for each in stmts)
+
+
+def test_comments_are_skipped():
+    (table,) = rd(CASES['comments'])
+    fields = table[2]
+    assert [each[0][0] for each in fields] == ['name']
+
+
+@pytest.mark.parametrize('source, row, col, expected', ERRORS)
+def test_syntax_error_position(source, row, col, expected):
+    with pytest.raises(DSLSyntaxError) as info:
+        rd(source)
+    message = str(info.value)
+    assert f'row {row} column {col}' in message
+    assert f'Expected {expected}' in message
+    # 旧解析器同样拒绝这些输入
+    with pytest.raises(SyntaxError):
+        legacy(source)
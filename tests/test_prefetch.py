@@ -0,0 +1,82 @@
+"""
+`prefetch` 的结果: 默认方式与 `--lazy` 下都在实例过期后失效, 列表属性的返回类型不变。
+"""
+import pytest
+
+SCHEMA = """
+User(id: int~){
+    name: NameStr
+}
+
+Course(id: int~){
+    title: NameStr
+}
+
+User <<->> Course{
+}
+"""
+
+
+@pytest.fixture(params=[(), ('--lazy=selectin',)])
+def models(request, load):
+    module = load(SCHEMA, *request.param)
+    session = module.db_session
+    session.add_all([module.User(id=1, name='u'), module.Course(id=1, title='a'), module.Course(id=2, title='b'),
+                     module.UserCourse(user_id=1, course_id=1)])
+    session.commit()
+    module.lazy = bool(request.param)
+    return module
+
+
+def course_ids(courses):
+    return sorted(each.id for each in courses)
+
+
+def test_prefetch_uses_loaded_rows(models):
+    user = models.User.query.get(1)
+    models.prefetch([user], 'ref_courses.course', 'courses')
+    models.db_session.add(models.UserCourse(user_id=1, course_id=2))
+    models.db_session.flush()
+    # 过期之前使用加载结果, 不再查询
+    assert course_ids(user.courses) == [1]
+    assert [each.course.id for each in user.ref_courses] == [1]
+
+
+@pytest.mark.parametrize('invalidate', ['commit', 'expire_all', 'refresh'])
+def test_prefetched_rows_expire_with_instance(models, invalidate):
+    session = models.db_session
+    user = models.User.query.get(1)
+    models.prefetch([user], 'ref_courses', 'courses')
+    session.add(models.UserCourse(user_id=1, course_id=2))
+    session.flush()
+    if invalidate == 'refresh':
+        session.refresh(user)
+    else:
+        getattr(session, invalidate)()
+    assert course_ids(user.courses) == [1, 2]
+    assert len(list(user.ref_courses)) == 2
+
+    models.prefetch([user], 'ref_courses', 'courses')
+    models.UserCourse.query.delete()
+    session.commit()
+    assert course_ids(user.courses) == []
+    assert list(user.ref_courses) == []
+
+
+def test_prefetched_query_keeps_query_interface(models):
+    if models.lazy:
+        pytest.skip('relationship() 的属性是列表')
+    session = models.db_session
+    user = models.User.query.get(1)
+    session.add(models.UserCourse(user_id=1, course_id=2))
+    session.flush()
+    models.prefetch([user], 'courses')
+    session.query(models.UserCourse).filter_by(course_id=1).delete()
+    session.flush()
+
+    courses = user.courses
+    assert isinstance(courses, type(models.Course.query))
+    assert course_ids(courses) == course_ids(courses.all()) == [1, 2]
+    assert courses.count() == 2 and courses.first() is not None
+    # 再加条件得到的 Query 查询数据库
+    assert course_ids(courses.filter(models.Course.id > 0)) == [2]
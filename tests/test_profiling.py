@@ -0,0 +1,42 @@
+"""
+`--profile` 与 `compile(..., profiler=...)` 统计的各阶段。
+"""
+import tracemalloc
+import pytest
+from dbglang.dbg_compiler import compile as dbg_compile
+from dbglang.profiling import Profiler
+
+SCHEMA = """
+User(id: int~){
+    name: NameStr
+}
+
+Course(id: int~){
+    title: NameStr
+}
+
+User <<->> Course{
+}
+"""
+
+CONFIG = "database_url = 'sqlite://'; database_connect_options = {}"
+
+
+def test_profile_ignores_warm_cache(tmp_path):
+    input_file = tmp_path / 'schema.dbg'
+    input_file.write_text(SCHEMA)
+    args = (str(input_file), str(tmp_path / 'out.py'), f'--cache-dir={tmp_path / "cache"}', '--samples=1', CONFIG)
+    dbg_compile(*args)
+
+    profiler = Profiler()
+    dbg_compile(*args, profiler=profiler)
+    for phase in ('tokenize', 'parse', 'ast_for_stmts', 'generate_table'):
+        assert profiler.seconds[phase] > 0, phase
+    assert not tracemalloc.is_tracing()
+
+
+def test_profiler_stopped_on_error(tmp_path):
+    profiler = Profiler()
+    with pytest.raises(OSError):
+        dbg_compile(str(tmp_path / 'missing.dbg'), str(tmp_path / 'out.py'), '--no-cache', profiler=profiler)
+    assert not tracemalloc.is_tracing()
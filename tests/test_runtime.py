@@ -0,0 +1,302 @@
+"""
+生成的模块中的运行时辅助函数: `bulk_insert_<t>`, `bulk_load`, `upsert_<t>_by_<f>`(含不支持 ON CONFLICT 时的退路),
+`enqueue_delete` / `run_delete_worker`, 以及 `~hilo` / `~snowflake` 的 id 分配。
+"""
+import pytest
+
+BULK = """
+User(id: int~){
+    name : NameStr!
+    email: NameStr?@
+    cost : int = 0
+    index{name, cost}
+}
+
+Course(id: int~){
+    title: NameStr?
+}
+
+User <<->> Course{
+    score: int?
+}
+"""
+
+UPSERT = """
+User(id: int~){
+    account : NameStr!
+    email   : NameStr?!
+    nickname: NameStr?
+    cost    : int = 0
+}
+"""
+
+QUEUE = """
+User(id: int~){
+    name: NameStr
+}
+
+Course(id: int~){
+    title: NameStr?
+}
+
+Note(id: int~){
+    text: TextStr?
+}
+
+User^ <<->> Course{
+}
+
+Course^ <->> Note{
+}
+"""
+
+IDS = """
+User(id: int~hilo){
+    name: NameStr!
+}
+
+Course(id: int~snowflake){
+    title: NameStr?
+}
+
+User^ <<->> Course{
+}
+"""
+
+
+def record_statements(module):
+    from sqlalchemy import event
+    statements = []
+    event.listen(module.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+
+def index_names(module, table):
+    from sqlalchemy import inspect
+    return sorted(each['name'] for each in inspect(module.db_session.connection()).get_indexes(table))
+
+
+def test_bulk_insert(load):
+    models = load(BULK)
+    statements = record_statements(models)
+    rows = ({'id': i, 'name': f'u{i}', 'cost': i} for i in range(1, 2501))
+    assert models.bulk_insert_user(rows, batch_size=1000) == 2500
+    # 每批一次 executemany
+    assert len([each for each in statements if each.startswith('INSERT')]) == 3
+    assert models.bulk_insert_course([{'id': 1}]) == 1
+    assert models.bulk_insert_user_course([{'user_id': 1, 'course_id': 1, 'score': 5}]) == 1
+    assert models.bulk_insert_user([]) == 0
+    models.db_session.commit()
+    assert models.User.query.count() == 2500
+    assert models.User.query.get(7).cost == 7
+    assert models.UserCourse.query.one().score == 5
+
+
+def test_bulk_insert_in_session_transaction(load):
+    models = load(BULK)
+    models.bulk_insert_user([{'id': 1, 'name': 'a'}])
+    models.db_session.rollback()
+    assert models.User.query.count() == 0
+
+
+def test_bulk_load_rebuilds_indexes(load):
+    models = load(BULK)
+    indexes = index_names(models, 'user')
+    unique = [each for each in indexes if each not in {index.name for index in models.User.__table__.indexes
+                                                       if not index.unique}]
+    assert len(indexes) > len(unique)
+    with models.bulk_load(models.User):
+        # 非唯一索引在导入期间删除, 唯一索引保留
+        assert index_names(models, 'user') == unique
+        models.bulk_insert_user({'id': i, 'name': f'u{i}'} for i in range(1, 101))
+    assert index_names(models, 'user') == indexes
+    assert models.User.query.count() == 100
+
+
+def test_bulk_load_rebuilds_indexes_on_error(load):
+    models = load(BULK)
+    indexes = index_names(models, 'user')
+    with pytest.raises(ZeroDivisionError):
+        with models.bulk_load():
+            models.bulk_insert_user([{'id': 1, 'name': 'a'}])
+            1 / 0
+    assert index_names(models, 'user') == indexes
+    # 出错时回滚
+    assert models.User.query.count() == 0
+
+
+@pytest.fixture(params=['on conflict', 'select'])
+def upsert_models(request, load, monkeypatch):
+    models = load(UPSERT)
+    if request.param == 'select':
+        monkeypatch.setattr(models, 'on_conflict_insert', lambda: None)
+    return models
+
+
+def users(models):
+    return sorted((each.id, each.account, each.nickname) for each in models.User.query)
+
+
+def test_upsert(upsert_models):
+    models = upsert_models
+    assert models.upsert_user_by_account([{'id': 1, 'account': 'a1', 'nickname': 'x'},
+                                          {'id': 2, 'account': 'a2', 'nickname': 'y'}]) == 2
+    models.db_session.commit()
+    # 已存在的 account 只更新非主键的列; 同一批中重复的键保留最后一行
+    assert models.upsert_user_by_account([{'id': 9, 'account': 'a1', 'nickname': 'z'},
+                                          {'id': 3, 'account': 'a3', 'nickname': 'w'},
+                                          {'id': 3, 'account': 'a3', 'nickname': 'w2'}]) == 2
+    # 只有键的行: 已存在时不修改
+    assert models.upsert_user_by_account([{'account': 'a2'}]) == 1
+    models.db_session.commit()
+    assert users(models) == [(1, 'a1', 'z'), (2, 'a2', 'y'), (3, 'a3', 'w2')]
+
+
+def test_upsert_batches(upsert_models):
+    models = upsert_models
+    rows = [{'id': i, 'account': f'a{i % 5}', 'nickname': str(i)} for i in range(1, 11)]
+    # 前 5 行插入, 后 5 行更新; 每批 3 行
+    assert models.upsert_user_by_account(rows[:5], batch_size=3) == 5
+    assert models.upsert_user_by_account(rows[5:], batch_size=3) == 5
+    models.db_session.commit()
+    assert users(models) == [(i, f'a{i % 5}', str(i + 5)) for i in range(1, 6)]
+
+
+def test_upsert_by_nullable_unique(upsert_models):
+    models = upsert_models
+    models.upsert_user_by_email([{'id': 1, 'account': 'a1', 'email': 'e@x', 'cost': 1}])
+    models.upsert_user_by_email([{'id': 2, 'account': 'a2', 'email': 'e@x', 'cost': 2}])
+    models.db_session.commit()
+    (user,) = models.User.query.all()
+    assert (user.id, user.account, user.cost) == (1, 'a2', 2)
+
+
+@pytest.fixture
+def queue_models(load, tmp_path):
+    # 后台删除在 db_session 之外提交, 使用文件数据库
+    config = f"database_url = 'sqlite:///{tmp_path / 'queue.db'}'; database_connect_options = {{}}"
+    models = load(QUEUE, config=config)
+    session = models.db_session
+    session.add_all([models.User(id=i, name=f'u{i}') for i in (1, 2)] +
+                    [models.Course(id=i) for i in range(1, 4)] +
+                    [models.UserCourse(user_id=1, course_id=1), models.UserCourse(user_id=1, course_id=2),
+                     models.UserCourse(user_id=2, course_id=3)] +
+                    [models.CourseNote(course_id=c, note_id=c) for c in range(1, 4)] +
+                    [models.Note(id=i) for i in range(1, 4)])
+    session.commit()
+    return models
+
+
+def test_delete_queue(queue_models):
+    models = queue_models
+    session = models.db_session
+    models.enqueue_delete(models.User.query.get(1))
+    session.commit()
+    assert [each for each, in models.queued_for_delete(models.User)] == [1]
+    assert models.User.query.filter(models.User.id.notin_(models.queued_for_delete(models.User))).one().id == 2
+
+    metrics = models.run_delete_worker(workers=2, batch_size=10, chunk_size=1)
+    assert (metrics.claimed, metrics.done, metrics.failed) == (1, 1, 0)
+    assert metrics.deleted['User'] == 1 and metrics.deleted['Course'] == 2
+    assert models.DeleteQueue.query.count() == 0
+    assert sorted(each.id for each in models.Course.query) == [3]
+    assert sorted(each.id for each in models.Note.query) == [3]
+
+
+def test_delete_queue_entity_already_deleted(queue_models):
+    models = queue_models
+    models.enqueue_delete(models.User.query.get(2))
+    models.delete_user(models.User.query.get(2))
+    models.db_session.commit()
+    metrics = models.run_delete_worker()
+    assert (metrics.done, metrics.failed) == (1, 0)
+    assert models.DeleteQueue.query.count() == 0
+
+
+def test_delete_queue_failure(queue_models):
+    models = queue_models
+    models.db_session.add(models.DeleteQueue(table='Missing', entity_id=1))
+    models.enqueue_delete(models.User.query.get(2))
+    models.db_session.commit()
+    metrics = models.run_delete_worker(max_attempts=2)
+    # 失败的项重新领取, 达到 max_attempts 后留在队列中
+    assert (metrics.claimed, metrics.done, metrics.failed) == (3, 1, 2)
+    (row,) = models.DeleteQueue.query.all()
+    assert (row.table, row.attempts, row.claimed_at) == ('Missing', 2, None)
+    assert row.error.startswith('StopIteration')
+    assert models.User.query.get(2) is None
+
+
+def test_hilo(load, tmp_path):
+    config = f"database_url = 'sqlite:///{tmp_path / 'ids.db'}'; database_connect_options = {{}}"
+    models = load(IDS, config=config)
+    session = models.db_session
+    models.HiLo.block_size = 3
+    session.execute(models.User.__table__.insert(), [{'id': 10, 'name': 'old'}])
+    session.commit()
+
+    # 第一次保留从已有的最大 id 之后开始
+    user = models.User(name='a')
+    session.add(user)
+    session.flush()
+    assert user.id == 11
+    assert models.bulk_insert_user({'name': f'b{i}'} for i in range(4)) == 4
+    session.commit()
+    assert sorted(each.id for each in models.User.query) == list(range(10, 16))
+    assert session.query(models.HiLoBlock).one().next_id == 17
+
+    # 回滚时丢弃在该事务中保留的 id
+    models.bulk_insert_user([{'name': f'c{i}'} for i in range(3)])
+    session.rollback()
+    assert session.query(models.HiLoBlock).one().next_id == 17
+    user_id = models.next_id(models.User)
+    assert user_id == 17
+    session.commit()
+
+
+def test_next_id_before_insert(load, monkeypatch):
+    monkeypatch.setenv('DBG_WORKER_ID', '5')
+    models = load(IDS)
+    session = models.db_session
+    user_id, course_id = models.next_id(models.User), models.next_id(models.Course)
+    # 插入前分配的 id 可以直接用于关联表
+    models.bulk_insert_user_course([{'user_id': user_id, 'course_id': course_id}])
+    models.bulk_insert_user([{'id': user_id, 'name': 'd'}])
+    models.bulk_insert_course([{'id': course_id}])
+    session.commit()
+    assert models.UserCourse.query.one().course.id == course_id
+    assert course_id >> 12 & 0x3ff == 5
+    assert course_id.bit_length() <= 63
+
+
+def test_snowflake_ordered(load):
+    models = load(IDS)
+    ids = [models.next_id(models.Course) for _ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    course = models.Course()
+    models.db_session.add(course)
+    models.db_session.flush()
+    assert course.id > ids[-1]
+
+
+@pytest.mark.parametrize('flags', [('--db-cascade',), ('--fk-relations', '--db-cascade')])
+def test_db_cascade_without_helpers(load, flags):
+    models = load(QUEUE, *flags)
+    session = models.db_session
+    session.add_all([models.User(id=1, name='u'), models.Course(id=1), models.Note(id=1)])
+    session.flush()
+    if hasattr(models, 'CourseNote'):
+        session.add(models.CourseNote(course_id=1, note_id=1))
+    else:
+        models.Note.query.filter_by(id=1).update({models.ForeignKeys[models.Note][models.Course]: 1})
+    session.add(models.UserCourse(user_id=1, course_id=1))
+    session.commit()
+    # 不经过 delete_<t>, 由数据库的 ON DELETE CASCADE 删除关联表的行与外键指向被删除者的行
+    session.execute(models.Course.__table__.delete())
+    session.commit()
+    assert models.UserCourse.query.count() == 0
+    if hasattr(models, 'CourseNote'):
+        assert models.CourseNote.query.count() == 0
+    else:
+        assert models.Note.query.count() == 0
@@ -0,0 +1,35 @@
+"""
+启动时导入的模块(见 benchmarks/bench_startup.py): 命中缓存的路径不导入 tempfile, `--samples=0` 不导入样例生成器。
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = "database_url = 'sqlite://'; database_connect_options = {}"
+
+
+def imported_after(code: str, *modules: str) -> dict:
+    """
+    在新的解释器中执行 code, 返回 modules 各自是否已被导入。
+    """
+    script = f'{code}\nimport sys\nprint(*[name in sys.modules for name in {modules!r}])'
+    output = subprocess.run([sys.executable, '-c', script], env=dict(os.environ, PYTHONPATH=ROOT),
+                            check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return dict(zip(modules, (each == 'True' for each in output.split())))
+
+
+def test_cache_hit_imports(tmp_path):
+    args = [os.path.join(ROOT, 'db.dbg'), str(tmp_path / 'out.py'), f'--cache-dir={tmp_path / "cache"}', CONFIG]
+    code = f'from dbglang import dbg_compiler\ndbg_compiler.compile(*{args!r})'
+    imported_after(code)
+    assert imported_after(code, 'tempfile', 'dbglang.code_gen') == {'tempfile': False, 'dbglang.code_gen': False}
+
+
+def test_no_samples_skips_sample_generator(tmp_path):
+    args = [os.path.join(ROOT, 'db.dbg'), str(tmp_path / 'out.py'), '--no-cache']
+    code = 'from dbglang import dbg_compiler\ndbg_compiler.compile(*{!r})'
+    assert imported_after(code.format(args + ['--samples=0', CONFIG]), 'dbglang.auto_db_test_maker') == {
+        'dbglang.auto_db_test_maker': False}
+    assert imported_after(code.format(args + ['--samples=1', CONFIG]), 'dbglang.auto_db_test_maker') == {
+        'dbglang.auto_db_test_maker': True}